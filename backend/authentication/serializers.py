@@ -1,6 +1,22 @@
+from dj_rest_auth.serializers import UserDetailsSerializer as BaseUserDetailsSerializer
 from rest_framework import serializers
 
+from wordcloud_core import user_cache
+
 
 class MFAVerifySerializer(serializers.Serializer):
     """Serializer for MFA token verification"""
     token = serializers.CharField(max_length=6, min_length=6)
+
+
+class UserDetailsSerializer(BaseUserDetailsSerializer):
+    """User details with the cached profile flags the frontend reads"""
+    profile = serializers.SerializerMethodField()
+
+    class Meta(BaseUserDetailsSerializer.Meta):
+        fields = BaseUserDetailsSerializer.Meta.fields + ('profile',)
+        read_only_fields = BaseUserDetailsSerializer.Meta.read_only_fields + ('profile',)
+
+    def get_profile(self, user):
+        profile = user_cache.get_profile(user.pk)
+        return {'mfa_enabled': profile.mfa_enabled} if profile else None
@@ -106,6 +106,20 @@ class MFATest(TestCase):
         self.assertIn('qr_code', response.data)
         self.assertIn('secret_key', response.data)
 
+    def test_user_details_profile(self):
+        """Test that user details include the MFA flag after it changes"""
+        url = reverse('rest_user_details')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['profile'], {'mfa_enabled': False})
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.mfa_enabled = True
+        profile.save()
+        self.client.post(self.disable_url)
+        response = self.client.get(url)
+        self.assertEqual(response.data['profile'], {'mfa_enabled': False})
+
     def test_mfa_disable(self):
         """Test disabling MFA"""
         # First enable MFA
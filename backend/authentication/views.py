@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django_otp.util import random_hex
+from wordcloud_core import user_cache
 from .serializers import MFAVerifySerializer
 
 # import requests
@@ -99,8 +100,8 @@ class MFASetupView(APIView):
         qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
         
         # Update user profile to indicate MFA is in setup phase (not yet enabled)
-        user.profile.mfa_enabled = False
-        user.profile.save()
+        # One UPDATE, without loading the profile first
+        user_cache.set_mfa_enabled(user.pk, False)
         
         # Return the QR code, secret key, and setup instructions
         return Response({
@@ -181,8 +182,7 @@ class MFAVerifyView(APIView):
             device.save()
             
             # Update user profile to indicate MFA is now enabled
-            user.profile.mfa_enabled = True
-            user.profile.save()
+            user_cache.set_mfa_enabled(user.pk, True)
             
             return Response({'message': 'MFA setup completed successfully.'})
         else:
@@ -236,8 +236,7 @@ class MFADisableView(APIView):
         TOTPDevice.objects.filter(user=user).delete()
         
         # Update user profile to indicate MFA is disabled
-        user.profile.mfa_enabled = False
-        user.profile.save()
+        user_cache.set_mfa_enabled(user.pk, False)
         
         return Response({'message': 'MFA has been disabled successfully.'})
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, WordCloud, UserCredit
+from .models import UserProfile, WordCloud, UserCredit, CreditLedgerEntry
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -16,6 +16,13 @@ class WordCloudAdmin(admin.ModelAdmin):
 
 @admin.register(UserCredit)
 class UserCreditAdmin(admin.ModelAdmin):
-    list_display = ('user', 'credits_remaining', 'last_updated')
+    list_display = ('user', 'credits_remaining', 'ledger_watermark', 'last_updated')
     search_fields = ('user__username', 'user__email')
-    readonly_fields = ('last_updated',)
+    readonly_fields = ('ledger_watermark', 'last_updated')
+
+@admin.register(CreditLedgerEntry)
+class CreditLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'amount', 'reservation', 'created_at')
+    search_fields = ('user__username', 'user__email')
+    list_filter = ('kind', 'created_at')
+    readonly_fields = ('created_at',)
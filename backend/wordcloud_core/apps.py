@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class WordcloudCoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wordcloud_core'
+
+    def ready(self):
+        # Resolve the bundled fonts once instead of on every render
+        from . import fonts
+        fonts.load_fonts()
+
+        # Connect the signals that invalidate cached credits and profiles
+        from . import user_cache  # noqa: F401
+
+        # Register the shared cache system checks
+        from . import checks  # noqa: F401
+
+        # Memory-map the offline suggestion index once per process
+        if settings.AI_SUGGESTIONS_SOURCE != 'openai':
+            from . import local_suggestions
+            local_suggestions.get_index()
@@ -0,0 +1,44 @@
+"""
+System checks for settings that only work across processes with a shared
+cache. Run by ``manage.py check`` and at startup of runserver and migrate.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Cache backends whose entries other worker processes cannot see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def _user_cache_is_shared():
+    return settings.CACHES[settings.WORDCLOUD_USER_CACHE_ALIAS]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Read replicas need the primary pins in a cache every web worker sees"""
+    if settings.WORDCLOUD_READ_REPLICAS and not _user_cache_is_shared():
+        return [Error(
+            'Read replicas are configured but the user data cache is process-local.',
+            hint='After a write, requests served by other workers would read a lagging replica. '
+                 'Set USER_CACHE_BACKEND and USER_CACHE_LOCATION to a shared cache such as Redis, '
+                 'or unset DB_REPLICA_HOSTS.',
+            id='wordcloud_core.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_user_cache_shared(app_configs, **kwargs):
+    """Cached credits and profiles are only invalidated in the process that made the change"""
+    if not _user_cache_is_shared():
+        return [Warning(
+            'The user data cache is process-local.',
+            hint='With more than one worker process, other workers serve stale credit balances and '
+                 'MFA state, and matching ETags, for up to WORDCLOUD_USER_CACHE_TIMEOUT seconds. '
+                 'Set USER_CACHE_BACKEND and USER_CACHE_LOCATION to a shared cache such as Redis.',
+            id='wordcloud_core.W001',
+        )]
+    return []
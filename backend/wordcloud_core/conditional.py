@@ -0,0 +1,46 @@
+"""
+Conditional GET for polled API views.
+
+Views provide cheap validators (a last-modified time plus anything else that
+identifies the current version, typically from one aggregate query). When
+the client's If-None-Match or If-Modified-Since still matches, the view
+answers 304 Not Modified before loading or serializing anything.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """Add ETag/Last-Modified to GET responses and answer 304 when they still match"""
+
+    def get_validators(self):
+        """
+        Return ``(last_modified, version)`` for the resource, or None when it
+        does not exist. ``version`` is any repr-able value that changes
+        whenever the representation does.
+        """
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        last_modified, version = validators
+        # Query string (fields, cursor) and Accept select different representations of the same data
+        key = repr((request.user.pk, request.get_full_path(), request.META.get('HTTP_ACCEPT'),
+                    last_modified and last_modified.isoformat(), version))
+        etag = quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
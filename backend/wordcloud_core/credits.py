@@ -0,0 +1,169 @@
+"""
+AI credit reservations on an append-only ledger.
+
+Every change to a user's credits is a ``CreditLedgerEntry`` insert, so busy
+users do not contend on their ``UserCredit`` row and the history is kept.
+A user's balance is the stored ``UserCredit.credits_remaining`` plus the
+entries after its ``ledger_watermark``, read in one query through the
+(user, id) index. ``compact`` periodically folds old entries into the stored
+balance so that sum stays short.
+
+A reservation is insert-then-verify: it appends a negative ``reserve``
+entry in its own durable transaction, then reads the balance. If the balance dropped below zero it appends
+a compensating ``reject`` entry and fails. Every insert commits before its
+balance check, so of two concurrent reservations the later check always
+sees the other one, and a credit can never be spent twice. Two racing for
+the last credit can both see the other and both reject; a rejected
+reservation therefore retries, after a random pause, while the balance
+covers it again. A balance that is already too low fails before anything
+is written. The caller then commits the reservation once the work
+succeeded, which writes nothing unless credits are given back, or refunds
+it. A batch reservation can commit only the credits it actually used and
+give the rest back.
+"""
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import user_cache
+from .models import CreditLedgerEntry, UserCredit
+
+# Tries per reservation when concurrent reservations rejected each other
+RESERVE_ATTEMPTS = 3
+# Upper bound of the random pause before the first retry, in seconds
+RESERVE_RETRY_DELAY = 0.02
+
+
+class InsufficientCredits(Exception):
+    """Raised when a user does not have enough credits left to reserve"""
+
+
+class Reservation:
+    """Credits taken from a user's balance, pending commit or refund"""
+    PENDING = 'pending'
+    COMMITTED = 'committed'
+    REFUNDED = 'refunded'
+
+    def __init__(self, user, amount, reference):
+        self.user = user
+        self.amount = amount
+        self.reference = reference
+        self.state = self.PENDING
+
+    def commit(self, used=None):
+        """Keep ``used`` credits (all of them by default) and refund the rest."""
+        if self.state != self.PENDING:
+            return
+        used = self.amount if used is None else max(0, min(used, self.amount))
+        # The reserve entry already took the credits; only a partial commit changes the balance
+        if used < self.amount:
+            _append(self.user, 'commit', self.amount - used, self.reference)
+        self.state = self.COMMITTED
+
+    def refund(self):
+        """Give every reserved credit back; does nothing once committed or refunded."""
+        if self.state != self.PENDING:
+            return
+        _append(self.user, 'refund', self.amount, self.reference)
+        self.state = self.REFUNDED
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.refund()
+        return False
+
+
+def _append(user, kind, amount, reference=None):
+    entry = CreditLedgerEntry.objects.create(user=user, kind=kind, amount=amount, reservation=reference)
+    user_cache.invalidate_credits(entry.user_id)
+    return entry
+
+
+def reserve(user, amount=1):
+    """
+    Take ``amount`` credits from ``user`` and return the Reservation.
+    Raises InsufficientCredits, leaving the balance unchanged, when it is too
+    low. Raises RuntimeError inside a transaction, where the reserve entry
+    would not be visible to concurrent reservations before the balance is
+    checked.
+    """
+    if amount < 1:
+        raise ValueError("Credit reservations must be for at least one credit")
+    for attempt in range(RESERVE_ATTEMPTS):
+        if attempt:
+            # Concurrent reservations can all see each other and all back off;
+            # if the credits are there again, try once more after a short pause
+            time.sleep(random.uniform(0, RESERVE_RETRY_DELAY * attempt))
+        if remaining(user) < amount:
+            break
+        reference = uuid.uuid4()
+        with transaction.atomic(durable=True):
+            _append(user, 'reserve', -amount, reference)
+        if remaining(user) >= 0:
+            return Reservation(user, amount, reference)
+        _append(user, 'reject', amount, reference)
+    raise InsufficientCredits(f"{amount} credit(s) requested")
+
+
+def grant(user, amount):
+    """Add ``amount`` credits to ``user``, e.g. after a purchase."""
+    return _append(user, 'grant', amount)
+
+
+def with_balance(queryset):
+    """
+    Annotate UserCredit rows with the live ``balance`` and ``last_activity``
+    (the latest ledger entry, or ``last_updated`` without one).
+    """
+    pending = (CreditLedgerEntry.objects
+               .filter(user=OuterRef('user'), id__gt=OuterRef('ledger_watermark'))
+               .order_by().values('user').annotate(total=Sum('amount')).values('total'))
+    latest = CreditLedgerEntry.objects.filter(user=OuterRef('user')).order_by('-id').values('created_at')[:1]
+    return queryset.annotate(
+        balance=F('credits_remaining') + Coalesce(Subquery(pending), 0),
+        last_activity=Coalesce(Subquery(latest), F('last_updated'))
+    )
+
+
+def remaining(user):
+    """Current credit balance of ``user``."""
+    return with_balance(UserCredit.objects.filter(user=user)).values_list('balance', flat=True).get()
+
+
+def compact(grace=None, user=None):
+    """
+    Fold ledger entries older than ``grace`` seconds into the stored balances
+    and advance each watermark, in one UPDATE. Returns the number of users
+    compacted. Entries are never deleted.
+    """
+    if grace is None:
+        grace = settings.WORDCLOUD_CREDIT_COMPACTION_GRACE
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    # Fold by id rather than time so the sum and the new watermark cover the same entries
+    boundary = CreditLedgerEntry.objects.filter(created_at__lt=cutoff).aggregate(last=Max('id'))['last']
+    if boundary is None:
+        return 0
+
+    folded = (CreditLedgerEntry.objects
+              .filter(user=OuterRef('user'), id__gt=OuterRef('ledger_watermark'), id__lte=boundary)
+              .order_by().values('user'))
+    credits = UserCredit.objects.filter(Exists(folded))
+    if user is not None:
+        credits = credits.filter(user=user)
+    return credits.update(
+        credits_remaining=F('credits_remaining') + Subquery(folded.annotate(total=Sum('amount')).values('total')),
+        ledger_watermark=Subquery(folded.annotate(last=Max('id')).values('last')),
+        last_updated=timezone.now()
+    )
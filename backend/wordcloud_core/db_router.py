@@ -0,0 +1,96 @@
+"""
+Read-replica routing for read-mostly API views.
+
+Replicas are listed in ``settings.WORDCLOUD_READ_REPLICAS`` (database
+aliases; empty means everything uses ``default``). Only views using
+``ReplicaReadMixin`` read from them, and only for safe methods: the mixin
+sets a context variable that ``ReadReplicaRouter`` checks, so every other
+query, and every write, goes to the primary.
+
+Replicas lag behind the primary. So a user does not miss their own change
+in the next list or detail, ``PinToPrimaryMiddleware`` pins the user to the
+primary for ``settings.WORDCLOUD_REPLICA_PIN_SECONDS`` after any successful
+write request. The pin is kept in the user data cache, which must be shared
+between workers when replicas are in use.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'wordcloud:primary-pin:{}'
+
+replica_reads = ContextVar('wordcloud_replica_reads', default=False)
+
+
+def pin_to_primary(user_id):
+    """Send the user's replica-eligible reads to the primary for a while."""
+    caches[settings.WORDCLOUD_USER_CACHE_ALIAS].set(
+        PIN_KEY.format(user_id), True, settings.WORDCLOUD_REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned_to_primary(user_id):
+    return bool(caches[settings.WORDCLOUD_USER_CACHE_ALIAS].get(PIN_KEY.format(user_id)))
+
+
+class ReadReplicaRouter:
+    """Route reads made under ReplicaReadMixin to a random replica; everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.WORDCLOUD_READ_REPLICAS:
+            return random.choice(settings.WORDCLOUD_READ_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica must still be saved to the primary
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.WORDCLOUD_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.WORDCLOUD_READ_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """Serve safe requests from a read replica unless the user wrote recently"""
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permission checks still read from the primary
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(request.user.pk):
+            self._replica_reads_token = replica_reads.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_reads_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Also when the view raised, so later queries on this thread use the primary
+            if self._replica_reads_token is not None:
+                replica_reads.reset(self._replica_reads_token)
+
+
+class PinToPrimaryMiddleware:
+    """Pin authenticated users to the primary after a successful write request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the user it authenticated (JWT, token) onto the Django request
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user.pk)
+        return response
@@ -0,0 +1,143 @@
+"""
+Process-wide font registry and text-metrics caches.
+
+Fonts are resolved from ``settings.WORDCLOUD_FONTS_DIR`` once instead of
+probing the file system on every render, loaded FreeType faces are kept per
+(path, size), and text bounding boxes are memoized per (word, font, size,
+orientation) because measuring text is a large share of layout time.
+Rasterized words are kept as grey-scale sprites so repeated vocabularies are
+drawn by alpha-blitting a cached mask in the word's color.
+"""
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+from wordcloud.wordcloud import FONT_PATH
+
+
+_font_paths = None
+_font_paths_lock = threading.Lock()
+
+# Text measurement does not depend on the image, only on its font mode ('L')
+_measure_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def load_fonts():
+    """Resolve every FONT_CHOICES entry to a font file, once per process."""
+    global _font_paths
+    from .models import WordCloud
+
+    paths = {}
+    for font, _ in WordCloud.FONT_CHOICES:
+        path = os.path.join(settings.WORDCLOUD_FONTS_DIR, f'{font}.ttf')
+        paths[font] = path if os.path.isfile(path) else FONT_PATH
+    with _font_paths_lock:
+        _font_paths = paths
+    return paths
+
+
+def get_font_path(font):
+    """Font file for a FONT_CHOICES key, or the wordcloud package's default font."""
+    paths = _font_paths if _font_paths is not None else load_fonts()
+    return paths.get(font, FONT_PATH)
+
+
+@lru_cache(maxsize=settings.WORDCLOUD_FONT_CACHE_SIZE)
+def get_font(path, size):
+    """Loaded FreeType face for ``path`` at ``size``."""
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=settings.WORDCLOUD_FONT_CACHE_SIZE)
+def get_transposed_font(path, size, orientation=None):
+    """``get_font`` wrapped for drawing with ``orientation`` (None or Image.ROTATE_90)."""
+    return ImageFont.TransposedFont(get_font(path, size), orientation=orientation)
+
+
+@lru_cache(maxsize=settings.WORDCLOUD_TEXT_METRICS_CACHE_SIZE)
+def text_bbox(word, path, size, orientation=None):
+    """Bounding box of ``word`` anchored at its top-left corner."""
+    return _measure_draw.textbbox((0, 0), word, font=get_transposed_font(path, size, orientation), anchor='lt')
+
+
+class SpriteCache:
+    """LRU of rasterized words bounded by total sprite bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, word, path, size, orientation=None):
+        """
+        Return ``(sprite, offset)`` for ``word``: an 'L' image holding the
+        glyph coverage, and where its top-left corner sits relative to the
+        point the word is drawn at.
+        """
+        key = (word, path, size, orientation)
+        with self._lock:
+            entry = self._sprites.get(key)
+            if entry is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = render_sprite(word, path, size, orientation)
+        sprite_bytes = entry[0].width * entry[0].height
+        with self._lock:
+            self.misses += 1
+            if key not in self._sprites and sprite_bytes <= self.max_bytes:
+                self._sprites[key] = entry
+                self.size_bytes += sprite_bytes
+                while self.size_bytes > self.max_bytes:
+                    _, (old, _) = self._sprites.popitem(last=False)
+                    self.size_bytes -= old.width * old.height
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._sprites.clear()
+            self.size_bytes = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'currsize': len(self._sprites),
+            'size_bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+def render_sprite(word, path, size, orientation=None):
+    """Rasterize ``word`` into a tightly cropped coverage mask."""
+    font = get_transposed_font(path, size, orientation)
+    left, top, right, bottom = _measure_draw.textbbox((0, 0), word, font=font)
+    sprite = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(sprite).text((-left, -top), word, fill=255, font=font)
+    return sprite, (left, top)
+
+
+sprites = SpriteCache(settings.WORDCLOUD_SPRITE_CACHE_BYTES)
+
+
+def draw_word(img, position, word, path, size, orientation, color):
+    """Draw ``word`` at ``position`` (x, y) by blitting its cached sprite in ``color``."""
+    sprite, (left, top) = sprites.get(word, path, size, orientation)
+    img.paste(color, (position[0] + left, position[1] + top), mask=sprite)
+
+
+def cache_info():
+    """Hit/miss statistics of the font, text-metrics and sprite caches."""
+    return {
+        'fonts': get_font.cache_info()._asdict(),
+        'transposed_fonts': get_transposed_font.cache_info()._asdict(),
+        'text_metrics': text_bbox.cache_info()._asdict(),
+        'sprites': sprites.info(),
+    }
@@ -0,0 +1,164 @@
+"""
+Offline related-word suggestions.
+
+The index is a word co-occurrence matrix built from past word cloud texts and
+stored as NumPy arrays in CSR layout, so it can be memory-mapped once per
+process and queried in a few milliseconds without calling OpenAI.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .text_processing import TOKEN_RE, clean_tokens, get_stopwords
+
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_FILE = 'vocabulary.json'
+ARRAY_FILES = ('frequencies', 'indptr', 'indices', 'weights')
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Yield lower-cased, stopword-free tokens from ``text``."""
+    stopwords = get_stopwords('en')
+    for word in clean_tokens(TOKEN_RE.findall(text)):
+        word = word.lower()
+        if len(word) >= 2 and word not in stopwords:
+            yield word
+
+
+def build_index(get_texts, path, vocabulary_size=20000, neighbours=50, window=5):
+    """
+    Build a co-occurrence index and write it to the ``path`` directory.
+
+    ``get_texts`` is a callable returning a fresh iterable of texts; it is
+    called twice (once for the vocabulary, once for co-occurrences) so the
+    corpus never has to be held in memory. Returns the vocabulary size.
+    """
+    counts = Counter()
+    for text in get_texts():
+        counts.update(tokenize(text))
+
+    vocabulary = [word for word, _ in counts.most_common(vocabulary_size)]
+    word_ids = {word: i for i, word in enumerate(vocabulary)}
+    frequencies = np.array([counts[word] for word in vocabulary], dtype=np.float32)
+
+    # Count co-occurrences inside a sliding window
+    pairs = defaultdict(Counter)
+    for text in get_texts():
+        ids = [word_ids[w] for w in tokenize(text) if w in word_ids]
+        for pos, i in enumerate(ids):
+            for j in ids[pos + 1:pos + 1 + window]:
+                if i != j:
+                    pairs[i][j] += 1
+                    pairs[j][i] += 1
+
+    # Keep the strongest neighbours per word, normalised so that very common
+    # words do not dominate every suggestion list
+    indptr = [0]
+    indices, weights = [], []
+    for i in range(len(vocabulary)):
+        scored = [
+            (j, count / np.sqrt(frequencies[i] * frequencies[j]))
+            for j, count in pairs.get(i, {}).items()
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        for j, weight in scored[:neighbours]:
+            indices.append(j)
+            weights.append(weight)
+        indptr.append(len(indices))
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        'frequencies': frequencies,
+        'indptr': np.array(indptr, dtype=np.int64),
+        'indices': np.array(indices, dtype=np.int32),
+        'weights': np.array(weights, dtype=np.float32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    with open(os.path.join(path, VOCABULARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f)
+
+    # Drop any cached copy so the next query sees the new index
+    with _indexes_lock:
+        _indexes.pop(str(path), None)
+
+    return len(vocabulary)
+
+
+class SuggestionIndex:
+    """Memory-mapped co-occurrence index answering related-word queries"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, VOCABULARY_FILE), encoding='utf-8') as f:
+            self.vocabulary = json.load(f)
+        self.word_ids = {word: i for i, word in enumerate(self.vocabulary)}
+        for name in ARRAY_FILES:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    def related(self, topic, count):
+        """
+        Return up to ``count`` words related to ``topic``, best first, or an
+        empty list when no topic word co-occurs with anything in the index.
+        """
+        topic_ids = [self.word_ids[w] for w in tokenize(topic) if w in self.word_ids]
+        if not topic_ids:
+            # Nothing is known about the topic; let the caller ask elsewhere
+            return []
+
+        scores = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for i in topic_ids:
+            start, end = self.indptr[i], self.indptr[i + 1]
+            np.add.at(scores, self.indices[start:end], self.weights[start:end])
+        scores[topic_ids] = 0
+
+        ranked = [int(j) for j in np.argsort(-scores, kind='stable')[:count] if scores[j] > 0]
+
+        # Pad with the most frequent words (the vocabulary is sorted by
+        # frequency) when the topic has some, but too few, neighbours
+        if ranked and len(ranked) < count:
+            seen = set(ranked) | set(topic_ids)
+            for j in range(len(self.vocabulary)):
+                if len(ranked) >= count:
+                    break
+                if j not in seen:
+                    ranked.append(j)
+
+        return [self.vocabulary[j] for j in ranked]
+
+
+def get_index(path=None):
+    """Return the cached index for ``path``, or None if it has not been built."""
+    path = str(path or settings.LOCAL_SUGGESTIONS_INDEX_DIR)
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+
+    with _indexes_lock:
+        if path not in _indexes:
+            if not os.path.exists(os.path.join(path, VOCABULARY_FILE)):
+                return None
+            try:
+                _indexes[path] = SuggestionIndex(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not load suggestion index from %s: %s", path, e)
+                return None
+        return _indexes[path]
+
+
+def suggest_words(topic, count):
+    """Return local suggestions for ``topic``, or None when no index is available."""
+    index = get_index()
+    if index is None:
+        return None
+    words = index.related(topic, count)
+    return words or None
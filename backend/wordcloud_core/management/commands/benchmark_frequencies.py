@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from wordcloud_core.text_processing import (
+    count_words,
+    count_words_approximate,
+    iter_text_chunks,
+    iter_token_batches,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare exact and approximate (Space-Saving) word counting for accuracy and throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Text file to count; a Zipf-distributed corpus is generated if omitted")
+        parser.add_argument('--words', type=int, default=2000000, help="Words in the generated corpus")
+        parser.add_argument('--vocabulary', type=int, default=500000, help="Vocabulary size of the generated corpus")
+        parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of the generated corpus")
+        parser.add_argument('--max-words', type=int, default=200, help="Top-k size to compare")
+        parser.add_argument('--error-bound', type=float, action='append',
+                            help="Error bound(s) to test (repeatable, default 0.001 and 0.0001)")
+
+    def handle(self, *args, **options):
+        text = self._load_corpus(options)
+        size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+        k = options['max_words']
+
+        start = time.perf_counter()
+        exact = count_words(iter_token_batches(iter_text_chunks(text)), max_distinct=10 ** 9)
+        exact_seconds = time.perf_counter() - start
+        total = sum(exact.values())
+        true_top = exact.most_common(k)
+
+        self.stdout.write(f"Corpus: {total} words, {len(exact)} distinct, {size_mb:.1f} MB")
+        self.stdout.write(
+            f"{'mode':<22}{'MB/s':>8}{'counters':>11}{'top-k recall':>14}{'max rel err':>13}{'bound':>10}"
+        )
+        self.stdout.write(
+            f"{'exact':<22}{size_mb / exact_seconds:>8.1f}{len(exact):>11}{1:>14.3f}{0:>13.4f}{'-':>10}"
+        )
+
+        for error_bound in options['error_bound'] or [0.001, 0.0001]:
+            start = time.perf_counter()
+            summary = count_words_approximate(iter_token_batches(iter_text_chunks(text)), error_bound, k)
+            seconds = time.perf_counter() - start
+
+            approx_top = {word for word, _ in summary.most_common(k)}
+            recall = len(approx_top & {word for word, _ in true_top}) / len(true_top)
+            max_rel_error = max(
+                abs(summary.counts.get(word, 0) - count) / count for word, count in true_top
+            )
+            self.stdout.write(
+                f"{f'approximate e={error_bound:g}':<22}{size_mb / seconds:>8.1f}"
+                f"{len(summary.counts):>11}{recall:>14.3f}{max_rel_error:>13.4f}"
+                f"{summary.max_error / total:>10.5f}"
+            )
+
+    def _load_corpus(self, options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8', errors='replace') as f:
+                return f.read()
+
+        # Draw word ranks from a truncated Zipf distribution
+        rng = np.random.default_rng(0)
+        ranks = np.arange(1, options['vocabulary'] + 1)
+        weights = ranks ** -options['zipf']
+        ids = rng.choice(options['vocabulary'], size=options['words'], p=weights / weights.sum())
+        return ' '.join(f"w{i}x" for i in ids)
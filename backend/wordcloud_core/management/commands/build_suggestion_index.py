@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wordcloud_core import local_suggestions
+from wordcloud_core.models import WordCloud
+
+
+class Command(BaseCommand):
+    help = "Build the offline AI suggestion index from past word cloud texts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.LOCAL_SUGGESTIONS_INDEX_DIR,
+                            help="Directory to write the index to")
+        parser.add_argument('--vocabulary-size', type=int, default=20000,
+                            help="Number of most frequent words to keep")
+        parser.add_argument('--neighbours', type=int, default=50,
+                            help="Related words stored per word")
+        parser.add_argument('--window', type=int, default=5,
+                            help="Co-occurrence window in tokens")
+
+    def handle(self, *args, **options):
+        def get_texts():
+            # Stream texts instead of caching the whole table in the queryset
+            return WordCloud.objects.iter_input_texts(chunk_size=500)
+
+        start = time.perf_counter()
+        size = local_suggestions.build_index(
+            get_texts,
+            options['output'],
+            vocabulary_size=options['vocabulary_size'],
+            neighbours=options['neighbours'],
+            window=options['window'],
+        )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {size} words into {options['output']} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wordcloud_core import credits
+
+
+class Command(BaseCommand):
+    help = "Fold old AI credit ledger entries into the stored balances (run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.WORDCLOUD_CREDIT_COMPACTION_GRACE,
+                            help="Only fold entries older than this many seconds")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        users = credits.compact(grace=options['grace'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted credit ledgers of {users} users in {elapsed:.2f}s"
+        ))
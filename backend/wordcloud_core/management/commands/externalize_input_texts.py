@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+
+from wordcloud_core.models import WordCloud
+
+
+class Command(BaseCommand):
+    help = "Move input texts stored inline before text blobs existed into compressed text blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Word clouds loaded per query")
+
+    def handle(self, *args, **options):
+        # Collect ids first, since every save takes its row out of the filter
+        ids = list(WordCloud.objects
+                   .filter(text_blob__isnull=True)
+                   .annotate(text_length=Length('inline_text'))
+                   .filter(text_length__gte=settings.WORDCLOUD_TEXT_BLOB_THRESHOLD)
+                   .values_list('id', flat=True))
+
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            batch = (WordCloud.objects.only('id', 'title', 'inline_text', 'text_blob')
+                     .filter(id__in=ids[start:start + batch_size]))
+            for wordcloud in batch:
+                # The setter keeps only the prefix inline; updated_at is left alone
+                wordcloud.input_text = wordcloud.inline_text
+                wordcloud.save(update_fields=['input_text'])
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(ids)} input texts into text blobs"))
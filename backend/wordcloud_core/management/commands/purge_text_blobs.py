@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wordcloud_core.models import TextBlob
+
+
+class Command(BaseCommand):
+    help = "Delete compressed input texts no word cloud refers to any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.WORDCLOUD_TEXT_BLOB_PURGE_GRACE,
+                            help="Keep blobs stored or reused within this many seconds")
+
+    def handle(self, *args, **options):
+        # A blob just returned by TextBlob.store may not be referenced yet
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        deleted, _ = TextBlob.objects.filter(wordclouds__isnull=True, last_stored_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unused text blobs"))
@@ -0,0 +1,158 @@
+"""
+Mask shapes for word clouds.
+
+A mask follows the wordcloud convention: pure white (255) pixels stay empty
+and every other pixel may hold words. Masks are preprocessed once per
+(shape, size) into the boolean array, the initial integral image used by
+the occupancy map and, on demand, the contour outline, so shaped renders
+do not rebuild them on every request.
+"""
+import io
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFilter
+
+
+MASK_CHOICES = [
+    ('none', 'None'),
+    ('circle', 'Circle'),
+    ('ellipse', 'Ellipse'),
+    ('heart', 'Heart'),
+    ('star', 'Star'),
+    ('diamond', 'Diamond'),
+    ('triangle', 'Triangle'),
+    ('custom', 'Custom image'),
+]
+
+STOCK_SHAPES = {'circle', 'ellipse', 'heart', 'star', 'diamond', 'triangle'}
+
+# Grey levels at or above this are treated as background in uploaded masks
+MASK_THRESHOLD = 128
+
+
+def _heart_outline(points=200):
+    t = np.linspace(0, 2 * np.pi, points)
+    x = 16 * np.sin(t) ** 3
+    y = 13 * np.cos(t) - 5 * np.cos(2 * t) - 2 * np.cos(3 * t) - np.cos(4 * t)
+    return list(zip((x + 17) / 34, (13 - y) / 30))
+
+
+def _star_outline(points=5, inner=0.4):
+    angles = np.arange(2 * points) * np.pi / points - np.pi / 2
+    radii = np.where(np.arange(2 * points) % 2 == 0, 0.5, 0.5 * inner)
+    return list(zip(0.5 + radii * np.cos(angles), 0.55 + radii * np.sin(angles)))
+
+
+# Polygons in a unit square, scaled to the largest centred square of the canvas
+OUTLINES = {
+    'heart': _heart_outline(),
+    'star': _star_outline(),
+    'diamond': [(0.5, 0), (1, 0.5), (0.5, 1), (0, 0.5)],
+    'triangle': [(0.5, 0), (1, 1), (0, 1)],
+}
+
+
+class MaskData:
+    """A mask preprocessed at one canvas size"""
+
+    def __init__(self, image):
+        # uint8 array passed to WordCloud(mask=...), 255 where no words go
+        self.image = image
+        self.boolean = image == 255
+        # Same initial integral image IntegralOccupancyMap computes from the mask
+        self.integral = np.cumsum(np.cumsum(255 * self.boolean, axis=1), axis=0).astype(np.uint32)
+        for array in (self.image, self.boolean, self.integral):
+            array.flags.writeable = False
+        self._contours = {}
+        self._contours_lock = threading.Lock()
+
+    def contour(self, size, width):
+        """Boolean outline of the mask for an image of ``size`` and a contour ``width``, as WordCloud draws it."""
+        key = (tuple(size), width)
+        with self._contours_lock:
+            if key in self._contours:
+                return self._contours[key]
+
+        contour = Image.fromarray(self.boolean.astype(np.uint8) * 255)
+        contour = contour.resize(size)
+        contour = contour.filter(ImageFilter.FIND_EDGES)
+        contour = np.array(contour)
+
+        # Make sure borders are not drawn before changing width
+        contour[[0, -1], :] = 0
+        contour[:, [0, -1]] = 0
+
+        contour = Image.fromarray(contour).filter(ImageFilter.GaussianBlur(radius=width / 10))
+        contour = np.array(contour) > 0
+        contour.flags.writeable = False
+
+        with self._contours_lock:
+            # Only a few export resolutions are ever requested per mask
+            if len(self._contours) >= 8:
+                self._contours.clear()
+            self._contours[key] = contour
+        return contour
+
+
+def draw_stock_mask(shape, width, height):
+    """Rasterize a stock shape as a mask array of ``height`` x ``width``."""
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    if shape == 'ellipse':
+        draw.ellipse((0, 0, width - 1, height - 1), fill=0)
+        return np.asarray(img)
+
+    side = min(width, height) - 1
+    left, top = (width - 1 - side) / 2, (height - 1 - side) / 2
+    if shape == 'circle':
+        draw.ellipse((left, top, left + side, top + side), fill=0)
+    else:
+        draw.polygon([(left + x * side, top + y * side) for x, y in OUTLINES[shape]], fill=0)
+    return np.asarray(img)
+
+
+@lru_cache(maxsize=settings.WORDCLOUD_MASK_CACHE_SIZE)
+def get_stock_mask(shape, width, height):
+    """Cached MaskData for a stock shape at a canvas size."""
+    return MaskData(draw_stock_mask(shape, width, height))
+
+
+def encode_mask(image, width, height):
+    """
+    Reduce an uploaded mask image to a 1-bit PNG of the canvas size: dark
+    pixels (the shape) hold words, light pixels stay empty. Transparent
+    pixels count as light.
+    """
+    image = Image.open(image) if not isinstance(image, Image.Image) else image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image.convert('RGBA'))
+    grey = image.convert('L').resize((width, height))
+    binary = grey.point(lambda value: 255 if value >= MASK_THRESHOLD else 0).convert('1')
+
+    buffer = io.BytesIO()
+    binary.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def resize_mask(data, width, height):
+    """Re-encode a stored mask for a new canvas size."""
+    return encode_mask(Image.open(io.BytesIO(bytes(data))), width, height)
+
+
+@lru_cache(maxsize=settings.WORDCLOUD_MASK_CACHE_SIZE)
+def _decode_mask(data):
+    image = np.asarray(Image.open(io.BytesIO(data)).convert('L'))
+    return MaskData(np.where(image == 255, 255, 0).astype(np.uint8))
+
+
+def get_mask(shape, width, height, image_data=None):
+    """Cached MaskData for a word cloud's mask settings, or None when it has no mask."""
+    if shape in STOCK_SHAPES:
+        return get_stock_mask(shape, width, height)
+    if shape == 'custom' and image_data:
+        return _decode_mask(bytes(image_data))
+    return None
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloud',
+            name='frequencies',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='wordcloud',
+            name='color_scheme',
+            field=models.CharField(choices=[('Reds', 'Reds'), ('Oranges', 'Oranges'), ('Greens', 'Greens'), ('Blues', 'Blues'), ('Purples', 'Purples'), ('Greys', 'Greys')], default='Reds', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='wordcloud',
+            name='input_text',
+            field=models.TextField(blank=True),
+        ),
+    ]
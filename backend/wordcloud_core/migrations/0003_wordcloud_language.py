@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0002_wordcloud_frequencies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloud',
+            name='language',
+            field=models.CharField(choices=[('en', 'English'), ('es', 'Spanish'), ('fr', 'French'), ('de', 'German'), ('it', 'Italian'), ('pt', 'Portuguese'), ('nl', 'Dutch')], default='en', max_length=5),
+        ),
+        migrations.AddField(
+            model_name='wordcloud',
+            name='lemmatize',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0003_wordcloud_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloud',
+            name='layout',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:06
+
+import wordcloud_core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0004_wordcloud_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloud',
+            name='seed',
+            field=models.PositiveIntegerField(default=wordcloud_core.models.generate_seed),
+        ),
+    ]
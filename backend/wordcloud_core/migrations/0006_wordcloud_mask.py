@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0005_wordcloud_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcloud',
+            name='contour_color',
+            field=models.CharField(default='black', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='wordcloud',
+            name='contour_width',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wordcloud',
+            name='mask_image',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wordcloud',
+            name='mask_shape',
+            field=models.CharField(choices=[('none', 'None'), ('circle', 'Circle'), ('ellipse', 'Ellipse'), ('heart', 'Heart'), ('star', 'Star'), ('diamond', 'Diamond'), ('triangle', 'Triangle'), ('custom', 'Custom image')], default='none', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0007_credit_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='wordcloud',
+            options={'ordering': ['-updated_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='wordcloud',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='wordcloud_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    tsvector column and GIN index on PostgreSQL, an FTS5 table on SQLite; both
+    backfilled with the first 100000 characters of each text (search.SEARCH_TEXT_LIMIT)
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("ALTER TABLE wordcloud_core_wordcloud ADD COLUMN search_vector tsvector")
+            cursor.execute(
+                "UPDATE wordcloud_core_wordcloud SET search_vector = "
+                "setweight(to_tsvector(%s::regconfig, coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, left(coalesce(input_text, ''), 100000)), 'B')",
+                [settings.WORDCLOUD_SEARCH_CONFIG, settings.WORDCLOUD_SEARCH_CONFIG]
+            )
+            cursor.execute(
+                "CREATE INDEX wordcloud_search_vector_idx ON wordcloud_core_wordcloud USING GIN (search_vector)"
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE wordcloud_core_wordcloud_fts "
+                "USING fts5(title, input_text, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                "INSERT INTO wordcloud_core_wordcloud_fts (rowid, title, input_text) "
+                "SELECT id, title, substr(input_text, 1, 100000) FROM wordcloud_core_wordcloud"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS wordcloud_search_vector_idx")
+            cursor.execute("ALTER TABLE wordcloud_core_wordcloud DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS wordcloud_core_wordcloud_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0008_wordcloud_user_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0009_wordcloud_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('compression', models.CharField(default='zlib', max_length=10)),
+                ('size', models.PositiveBigIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # The field is renamed but keeps its column, so only the state changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='wordcloud',
+                    old_name='input_text',
+                    new_name='inline_text',
+                ),
+                migrations.AlterField(
+                    model_name='wordcloud',
+                    name='inline_text',
+                    field=models.TextField(blank=True, db_column='input_text'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='wordcloud',
+            name='text_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='wordclouds', to='wordcloud_core.textblob'),
+        ),
+    ]
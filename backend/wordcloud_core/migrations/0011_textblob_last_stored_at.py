@@ -0,0 +1,17 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wordcloud_core', '0010_text_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textblob',
+            name='last_stored_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+import hashlib
+import random
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search
+from .masks import MASK_CHOICES
 
 
 class UserProfile(models.Model):
@@ -18,15 +27,101 @@ class UserProfile(models.Model):
 class UserCredit(models.Model):
     """Track user credits for AI-generated word clouds"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='credits')
+    # Balance as of ledger_watermark; credits.remaining() adds newer ledger entries
     credits_remaining = models.IntegerField(default=3)  # Free users get 3 free uses
+    ledger_watermark = models.BigIntegerField(default=0)  # Last CreditLedgerEntry id folded into the balance
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.credits_remaining} credits"
 
 
+class CreditLedgerEntry(models.Model):
+    """Append-only record of one change to a user's AI credits"""
+    KIND_CHOICES = [
+        ('reserve', 'Reserve'),
+        ('commit', 'Commit'),
+        ('refund', 'Refund'),
+        ('reject', 'Reject'),
+        ('grant', 'Grant'),
+    ]
+
+    # Balance queries go through the (user, id) index instead
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credit_entries', db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.IntegerField()  # Signed change to the balance
+    reservation = models.UUIDField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='credit_ledger_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.kind} {self.amount:+d}"
+
+
+def decompress_text(compression, data):
+    """Text stored in a TextBlob's ``data`` with ``compression``."""
+    if compression == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    raise ValueError(f"Unknown text compression: {compression}")
+
+
+class TextBlob(models.Model):
+    """Compressed input text, shared by every word cloud with the same content"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    compression = models.CharField(max_length=10, default='zlib')
+    size = models.PositiveBigIntegerField()  # Uncompressed UTF-8 bytes
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed whenever a save reuses the blob; unused blobs are purged after a grace period
+    last_stored_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def store(cls, text):
+        """Return the blob holding ``text``, compressing and inserting it only if no cloud stored it before."""
+        raw = text.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        blob = cls.objects.only('id').filter(sha256=digest).first()
+        # Marking the blob as used keeps purge_text_blobs from deleting it before the cloud is saved
+        if blob is not None and cls.objects.filter(pk=blob.pk).update(last_stored_at=timezone.now()):
+            return blob
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    sha256=digest,
+                    compression='zlib',
+                    size=len(raw),
+                    data=zlib.compress(raw, settings.WORDCLOUD_TEXT_COMPRESSION_LEVEL)
+                )
+        except IntegrityError:
+            # Stored concurrently by another request
+            return cls.objects.only('id').get(sha256=digest)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+def generate_seed():
+    """Random layout seed for a new word cloud"""
+    return random.randrange(2 ** 31)
+
+
+class WordCloudQuerySet(models.QuerySet):
+    def iter_input_texts(self, chunk_size=500):
+        """Stream the full input texts without loading the other columns"""
+        rows = self.values_list('inline_text', 'text_blob__compression', 'text_blob__data')
+        for inline_text, compression, data in rows.iterator(chunk_size=chunk_size):
+            yield decompress_text(compression, data) if data is not None else inline_text
+
+
 class WordCloud(models.Model):
     """Stores word cloud data and settings"""
+    # Characters of an externalized text kept in inline_text (list previews read them)
+    INLINE_PREFIX_LENGTH = 1000
+
     FONT_CHOICES = [
         ('arial', 'Arial'),
         ('times', 'Times New Roman'),
@@ -53,9 +148,27 @@ class WordCloud(models.Model):
         ('random', 'Random'),
     ]
 
+    # Languages with a bundled stopword list (see wordcloud_core/stopwords/)
+    LANGUAGE_CHOICES = [
+        ('en', 'English'),
+        ('es', 'Spanish'),
+        ('fr', 'French'),
+        ('de', 'German'),
+        ('it', 'Italian'),
+        ('pt', 'Portuguese'),
+        ('nl', 'Dutch'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='word_clouds')
     title = models.CharField(max_length=100)
-    input_text = models.TextField()
+    # Read and assign the text through the input_text property. Texts of at least
+    # WORDCLOUD_TEXT_BLOB_THRESHOLD characters are moved to a shared, compressed
+    # TextBlob when saved, and only their first INLINE_PREFIX_LENGTH characters stay inline.
+    inline_text = models.TextField(blank=True, db_column='input_text')
+    text_blob = models.ForeignKey(TextBlob, on_delete=models.PROTECT, blank=True, null=True,
+                                  related_name='wordclouds')
+    # Word weights used instead of input_text when the cloud was built from a frequency map
+    frequencies = models.JSONField(blank=True, null=True)
     is_ai_generated = models.BooleanField(default=False)
 
     # Customization options
@@ -68,6 +181,22 @@ class WordCloud(models.Model):
     word_density = models.PositiveIntegerField(default=80)  # Scale of 1–100
     orientation = models.CharField(max_length=20, choices=ORIENTATION_CHOICES, default='random')
 
+    # Shape the words are laid out in; 'custom' uses mask_image
+    mask_shape = models.CharField(max_length=20, choices=MASK_CHOICES, default='none')
+    mask_image = models.BinaryField(blank=True, null=True)  # 1-bit PNG at the canvas size
+    contour_width = models.PositiveIntegerField(default=0)  # Outline drawn around the mask shape
+    contour_color = models.CharField(max_length=20, default='black')
+
+    # Text processing options
+    language = models.CharField(max_length=5, choices=LANGUAGE_CHOICES, default='en')
+    lemmatize = models.BooleanField(default=False)  # Merge plural forms into the singular
+
+    # Seeds the layout RNG so every render of the same parameters is identical
+    seed = models.PositiveIntegerField(default=generate_seed)
+    # Word placement from the last layout pass, reused when only colors change
+    # and cleared when a field that affects placement changes
+    layout = models.JSONField(blank=True, null=True)
+
     # Storage details
     image_url = models.URLField(blank=True, null=True)
     svg_url = models.URLField(blank=True, null=True)
@@ -76,12 +205,72 @@ class WordCloud(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WordCloudQuerySet.as_manager()
+
+    # Text assigned since the last save, and the loaded or assigned full text
+    _pending_text = None
+    _text = None
+    # Title as last loaded or saved, and whether the save in progress changes search terms
+    _indexed_title = None
+    _search_dirty = True
+
     class Meta:
-        ordering = ['-updated_at']
+        ordering = ['-updated_at', '-id']
+        indexes = [
+            # Per-user listing in pagination order
+            models.Index(fields=['user', '-updated_at', '-id'], name='wordcloud_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def input_text(self):
+        """The full input text; an externalized text is loaded on first access."""
+        if self._text is None:
+            if self.text_blob_id is None:
+                return self.inline_text
+            compression, data = TextBlob.objects.values_list('compression', 'data').get(pk=self.text_blob_id)
+            self._text = decompress_text(compression, data)
+        return self._text
+
+    @input_text.setter
+    def input_text(self, value):
+        value = value or ''
+        current = self._text if self._text is not None else (self.inline_text if self.text_blob_id is None else None)
+        # Unchanged and stored the way its length calls for (rows from before blobs may not be)
+        if value == current and self._externalize(value) == (self.text_blob_id is not None):
+            return
+        self._text = self._pending_text = value
+        self.inline_text = value[:self.INLINE_PREFIX_LENGTH] if self._externalize(value) else value
+
+    @staticmethod
+    def _externalize(text):
+        return len(text) >= settings.WORDCLOUD_TEXT_BLOB_THRESHOLD
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_title = instance.__dict__.get('title')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self._search_dirty = (self._state.adding or self._pending_text is not None
+                              or self.__dict__.get('title') != self._indexed_title)
+        if self._pending_text is not None:
+            self.text_blob = TextBlob.store(self._pending_text) if self._externalize(self._pending_text) else None
+            self._pending_text = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'input_text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'inline_text', 'text_blob'} - {'input_text'}
+        super().save(*args, **kwargs)
+        self._indexed_title = self.__dict__.get('title')
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._text = self._pending_text = None
+        self._indexed_title = self.__dict__.get('title')
+
 
 # Signal handlers to create profile and credits when a user is created
 @receiver(post_save, sender=User)
@@ -89,3 +278,20 @@ def create_user_profile_and_credits(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
         UserCredit.objects.create(user=instance)
+
+
+# Keep the full-text search index in step with saved word clouds
+@receiver(post_save, sender=WordCloud)
+def index_wordcloud(sender, instance, using, update_fields=None, **kwargs):
+    # Only when the title or text changed; reindexing loads and resends the whole text
+    if update_fields is None:
+        changed = instance._search_dirty
+    else:
+        changed = bool({'title', 'inline_text', 'text_blob'} & set(update_fields))
+    if changed:
+        search.index_wordcloud(instance, using)
+
+
+@receiver(post_delete, sender=WordCloud)
+def unindex_wordcloud(sender, instance, using, **kwargs):
+    search.unindex_wordcloud(instance.pk, using)
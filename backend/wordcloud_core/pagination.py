@@ -0,0 +1,53 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class WordCloudCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (updated_at, id), newest first. Each page is an
+    index range scan from the cursor position, so deep pages cost the same
+    as the first one and no COUNT(*) is run.
+    """
+    ordering = ('-updated_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchPagination(LimitOffsetPagination):
+    """
+    limit/offset pages over ranked search results. One extra row is fetched
+    to tell whether a next page exists, so matches are never counted.
+    """
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        if self.offset - self.limit <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, self.offset - self.limit)
@@ -0,0 +1,210 @@
+"""
+Out-of-process rendering with rasters handed back through shared memory.
+
+The web process owns a ring of fixed-size slots in one
+``multiprocessing.shared_memory`` segment. For each render it takes the next
+free slot and sends the job to a render worker. The worker copies the RGBA
+pixels into that slot and returns only a small ``RasterHandle``.
+The web process then wraps the slot's memoryview in a PIL image without
+copying it, encodes and uploads it, and releases the slot for the next
+render. Pixel data never goes through a pipe or pickle.
+"""
+import atexit
+import logging
+import multiprocessing
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+from django.conf import settings
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+# Where a rendered raster sits in the ring: slot index, PIL mode, (width, height) and byte length
+RasterHandle = namedtuple('RasterHandle', ['slot', 'mode', 'size', 'nbytes'])
+
+# Modes PIL can wrap around an external buffer without copying
+SHARED_MODES = {'L': 1, 'RGBA': 4}
+
+
+class RasterTooLarge(ValueError):
+    """Raised when a rendered raster does not fit in a ring slot"""
+
+
+class RasterRing:
+    """Fixed-size raster slots in a single shared memory segment, handed out in ring order"""
+
+    def __init__(self, slots, slot_size):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self, timeout=None):
+        """Take the next free slot, waiting up to ``timeout`` seconds for one."""
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No free raster slot within {timeout}s") from None
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def view(self, slot, nbytes):
+        """Memoryview over the first ``nbytes`` of ``slot``."""
+        start = slot * self.slot_size
+        return self.shm.buf[start:start + nbytes]
+
+    def image(self, handle):
+        """PIL image reading the raster in place; only valid until the slot is released."""
+        return Image.frombuffer(handle.mode, handle.size, self.view(handle.slot, handle.nbytes),
+                                'raw', handle.mode, 0, 1)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Segments attached by this (worker) process, by name
+_attached = {}
+
+
+def attach(name):
+    """Attach to a ring segment created by the web process, once per worker."""
+    shm = _attached.get(name)
+    if shm is None:
+        # Spawned workers share the web process's resource tracker, so the
+        # segment is only unlinked by RasterRing.close() (or if it crashes)
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def write_raster(shm, slot, slot_size, image):
+    """Copy ``image`` into ``slot`` of an attached segment and return its handle."""
+    if image.mode not in SHARED_MODES:
+        image = image.convert('RGBA')
+    nbytes = image.width * image.height * SHARED_MODES[image.mode]
+    if nbytes > slot_size:
+        raise RasterTooLarge(f"{image.width}x{image.height} {image.mode} raster needs {nbytes} bytes, "
+                             f"slots hold {slot_size}")
+    start = slot * slot_size
+    shm.buf[start:start + nbytes] = image.tobytes()
+    return RasterHandle(slot, image.mode, image.size, nbytes)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _render_job(ring_name, slot, slot_size, data):
+    """Worker entry point: render a generation request into a ring slot."""
+    from .rendering import render_generated
+
+    image, layout = render_generated(data)
+    return write_raster(attach(ring_name), slot, slot_size, image), layout
+
+
+class RenderPool:
+    """Render worker processes returning rasters through a RasterRing"""
+
+    def __init__(self, workers, slots, slot_size, slot_timeout=None):
+        self.ring = RasterRing(slots, slot_size)
+        self.slot_timeout = slot_timeout
+        # spawn rather than fork: request workers may be multi-threaded
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    @contextmanager
+    def render(self, data):
+        """
+        Render generation options in a worker and yield ``(image, layout)``.
+        The image shares the slot's memory, so encode or copy it inside the
+        ``with`` block; the slot is released on exit. Raises BrokenProcessPool
+        when a worker died; the process-wide pool is then replaced on next use,
+        and RasterTooLarge, before rendering, when the canvas cannot fit a slot.
+        """
+        from .rendering import estimate_raster_bytes
+
+        # Checked up front so an oversized canvas is not rendered twice
+        nbytes = estimate_raster_bytes(data['width'], data['height'])
+        if nbytes > self.ring.slot_size:
+            raise RasterTooLarge(f"{data['width']}x{data['height']} canvas needs up to {nbytes} bytes, "
+                                 f"slots hold {self.ring.slot_size}")
+
+        slot = self.ring.acquire(timeout=self.slot_timeout)
+        try:
+            try:
+                future = self.executor.submit(_render_job, self.ring.name, slot, self.ring.slot_size, data)
+                handle, layout = future.result()
+            except BrokenProcessPool:
+                # A worker died; this executor cannot run anything any more
+                discard_render_pool(self)
+                raise
+            image = self.ring.image(handle)
+            try:
+                yield image, layout
+            finally:
+                # Drop the exported buffer before the slot is reused
+                image.close()
+        finally:
+            self.ring.release(slot)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.ring.close()
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return the process-wide render pool, creating it on first use."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = RenderPool(
+                settings.WORDCLOUD_RENDER_WORKERS,
+                settings.WORDCLOUD_RENDER_SLOTS,
+                settings.WORDCLOUD_RENDER_SLOT_BYTES,
+                settings.WORDCLOUD_RENDER_SLOT_TIMEOUT
+            )
+            atexit.register(_render_pool.shutdown)
+        return _render_pool
+
+
+def shutdown_render_pool():
+    """Shut down the process-wide render pool, if any; the next render starts a new one."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        atexit.unregister(pool.shutdown)
+        pool.shutdown()
+
+
+def discard_render_pool(pool):
+    """Stop using ``pool`` after a worker died, so get_render_pool() starts a new one."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    # Renders still holding ring slots keep the segment until the atexit shutdown
+    pool.executor.shutdown(wait=False, cancel_futures=True)
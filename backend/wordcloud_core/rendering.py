@@ -0,0 +1,319 @@
+"""
+Word cloud construction and rendering on top of the shared font caches.
+
+``CachedWordCloud`` lays out and draws exactly like ``wordcloud.WordCloud``
+but takes fonts and text measurements from ``fonts`` instead of reopening a
+FreeType face for every word and font size it tries, and draws words by
+blitting cached sprites instead of rasterizing them again.
+
+Nothing here touches pyplot's global figure state, so renders can run
+concurrently in threaded workers.
+"""
+import io
+from operator import itemgetter
+from random import Random
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image, ImageColor
+from wordcloud import WordCloud as WC
+from wordcloud.wordcloud import IntegralOccupancyMap
+
+from .fonts import draw_word, get_font_path, text_bbox
+from .masks import get_mask
+from .text_processing import count_text
+
+# Resolution of rendered images; the figure is width/100 by height/100 inches
+RENDER_DPI = 300
+
+# Generation options read by layout_wordcloud and render_generated; only these
+# are sent to render workers
+RENDER_OPTIONS = (
+    'title', 'input_text', 'frequencies', 'width', 'height', 'font', 'color_scheme',
+    'background_color', 'max_words', 'word_density', 'orientation', 'language', 'lemmatize',
+    'seed', 'mask_shape', 'mask_image', 'contour_width', 'contour_color',
+)
+
+
+class PrecomputedOccupancyMap(IntegralOccupancyMap):
+    """Occupancy map starting from a mask's cached integral image"""
+
+    def __init__(self, integral):
+        self.height, self.width = integral.shape
+        self.integral = integral.copy()
+
+
+class CachedWordCloud(WC):
+    """WordCloud whose layout and drawing use the process-wide font caches"""
+    # Preprocessed form of ``mask`` (see masks.MaskData), set by build_wordcloud
+    mask_data = None
+
+    def _get_bolean_mask(self, mask):
+        if self.mask_data is not None and mask is self.mask_data.image:
+            return self.mask_data.boolean
+        return super()._get_bolean_mask(mask)
+
+    def generate_from_frequencies(self, frequencies, max_font_size=None):
+        """Same algorithm as WordCloud.generate_from_frequencies (wordcloud 1.9.6) with cached fonts and metrics."""
+        frequencies = sorted(frequencies.items(), key=itemgetter(1), reverse=True)
+        if len(frequencies) <= 0:
+            raise ValueError("We need at least 1 word to plot a word cloud, "
+                             "got %d." % len(frequencies))
+        frequencies = frequencies[:self.max_words]
+
+        # Largest entry will be 1
+        max_frequency = float(frequencies[0][1])
+        frequencies = [(word, freq / max_frequency) for word, freq in frequencies]
+
+        random_state = self.random_state if self.random_state is not None else Random()
+
+        if self.mask is not None:
+            boolean_mask = self._get_bolean_mask(self.mask)
+            width = self.mask.shape[1]
+            height = self.mask.shape[0]
+        else:
+            boolean_mask = None
+            height, width = self.height, self.width
+        if self.mask_data is not None and self.mask is self.mask_data.image:
+            occupancy = PrecomputedOccupancyMap(self.mask_data.integral)
+        else:
+            occupancy = IntegralOccupancyMap(height, width, boolean_mask)
+
+        img_grey = Image.new("L", (width, height))
+        font_sizes, positions, orientations, colors = [], [], [], []
+        last_freq = 1.
+
+        if max_font_size is None:
+            max_font_size = self.max_font_size
+
+        if max_font_size is None:
+            # Find a good font size by laying out just the first two words
+            if len(frequencies) == 1:
+                font_size = self.height
+            else:
+                self.generate_from_frequencies(dict(frequencies[:2]), max_font_size=self.height)
+                sizes = [x[1] for x in self.layout_]
+                try:
+                    font_size = int(2 * sizes[0] * sizes[1] / (sizes[0] + sizes[1]))
+                except IndexError:
+                    try:
+                        font_size = sizes[0]
+                    except IndexError:
+                        raise ValueError(
+                            "Couldn't find space to draw. Either the Canvas size"
+                            " is too small or too much of the image is masked "
+                            "out.")
+        else:
+            font_size = max_font_size
+
+        self.words_ = dict(frequencies)
+
+        if self.repeat and len(frequencies) < self.max_words:
+            # Pad frequencies with repeating words
+            times_extend = int(np.ceil(self.max_words / len(frequencies))) - 1
+            frequencies_org = list(frequencies)
+            downweight = frequencies[-1][1]
+            for i in range(times_extend):
+                frequencies.extend([(word, freq * downweight ** (i + 1))
+                                    for word, freq in frequencies_org])
+
+        for word, freq in frequencies:
+            if freq == 0:
+                continue
+            rs = self.relative_scaling
+            if rs != 0:
+                font_size = int(round((rs * (freq / float(last_freq)) + (1 - rs)) * font_size))
+            orientation = None if random_state.random() < self.prefer_horizontal else Image.ROTATE_90
+            tried_other_orientation = False
+            while True:
+                if font_size < self.min_font_size:
+                    break
+                box_size = text_bbox(word, self.font_path, font_size, orientation)
+                result = occupancy.sample_position(box_size[3] + self.margin,
+                                                   box_size[2] + self.margin,
+                                                   random_state)
+                if result is not None:
+                    break
+                # No room: try the other orientation first, then a smaller font
+                if not tried_other_orientation and self.prefer_horizontal < 1:
+                    orientation = Image.ROTATE_90
+                    tried_other_orientation = True
+                else:
+                    font_size -= self.font_step
+                    orientation = None
+
+            if font_size < self.min_font_size:
+                break
+
+            x, y = np.array(result) + self.margin // 2
+            draw_word(img_grey, (y, x), word, self.font_path, font_size, orientation, 255)
+            positions.append((x, y))
+            orientations.append(orientation)
+            font_sizes.append(font_size)
+            colors.append(self.color_func(word, font_size=font_size,
+                                          position=(x, y),
+                                          orientation=orientation,
+                                          random_state=random_state,
+                                          font_path=self.font_path))
+            if self.mask is None:
+                img_array = np.asarray(img_grey)
+            else:
+                img_array = np.asarray(img_grey) + boolean_mask
+            occupancy.update(img_array, x, y)
+            last_freq = freq
+
+        self.layout_ = list(zip(frequencies, font_sizes, positions, orientations, colors))
+        return self
+
+    def to_image(self):
+        self._check_generated()
+        if self.mask is not None:
+            width = self.mask.shape[1]
+            height = self.mask.shape[0]
+        else:
+            height, width = self.height, self.width
+
+        img = Image.new(self.mode, (int(width * self.scale), int(height * self.scale)),
+                        self.background_color)
+        for (word, count), font_size, position, orientation, color in self.layout_:
+            pos = (int(position[1] * self.scale), int(position[0] * self.scale))
+            draw_word(img, pos, word, self.font_path, int(font_size * self.scale), orientation,
+                      ImageColor.getcolor(color, self.mode))
+
+        return self._draw_contour(img=img)
+
+    def _draw_contour(self, img):
+        if self.mask_data is None or self.mask is not self.mask_data.image or self.contour_width == 0:
+            return super()._draw_contour(img)
+
+        contour = self.mask_data.contour(img.size, self.contour_width)
+        contour = np.dstack((contour, contour, contour))
+
+        # Color the contour
+        ret = np.array(img) * np.invert(contour)
+        if self.contour_color != 'black':
+            color = Image.new(img.mode, img.size, self.contour_color)
+            ret += np.array(color) * contour
+
+        return Image.fromarray(ret)
+
+
+def build_wordcloud(font, width, height, background_color, max_words, orientation, scale, color_scheme, seed=None,
+                    mask=None, contour_width=0, contour_color='black'):
+    """
+    Configure a CachedWordCloud from the options stored on a WordCloud.
+    ``seed`` makes its layout reproducible and ``mask`` is a masks.MaskData.
+    """
+    wc_obj = CachedWordCloud(
+        width=width,
+        height=height,
+        background_color=background_color,
+        max_words=max_words,
+        prefer_horizontal=1.0 if orientation == 'horizontal' else
+        0.0 if orientation == 'vertical' else 0.5,
+        scale=scale,
+        font_path=get_font_path(font),
+        colormap=color_scheme if color_scheme != 'default' else None,
+        random_state=seed,
+        mask=mask.image if mask is not None else None,
+        contour_width=contour_width,
+        contour_color=contour_color
+    )
+    wc_obj.mask_data = mask
+    return wc_obj
+
+
+def layout_to_json(layout):
+    """Serialize ``WordCloud.layout_`` as [word, frequency, font_size, x, y, orientation, color] rows."""
+    return [
+        [word, freq, int(font_size), int(position[0]), int(position[1]),
+         int(orientation) if orientation is not None else None, color]
+        for (word, freq), font_size, position, orientation, color in layout
+    ]
+
+
+def apply_layout(wc_obj, layout):
+    """Restore a layout saved by layout_to_json so ``wc_obj`` can be recolored and drawn without a layout pass."""
+    wc_obj.layout_ = [
+        ((word, freq), font_size, (x, y), Image.Transpose(orientation) if orientation is not None else None, color)
+        for word, freq, font_size, x, y, orientation, color in layout
+    ]
+    wc_obj.words_ = {word: freq for word, freq, *_ in layout}
+    return wc_obj
+
+
+def compact_layout(layout):
+    """
+    Convert stored layout rows to what a client needs to draw them:
+    [word, font_size, left, top, vertical, color], with left/top in pixels of
+    the unscaled canvas and vertical set for words rotated 90 degrees.
+    """
+    return [
+        [word, font_size, y, x, 1 if orientation is not None else 0, color]
+        for word, _, font_size, x, y, orientation, color in layout
+    ]
+
+
+def render_wordcloud_image(wc_obj, title, width, height):
+    """Draw a laid-out WordCloud with its title on a private matplotlib Figure and return a PIL Image"""
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.imshow(wc_obj.to_array(), interpolation='bilinear')
+    ax.set_title(title, fontsize=16)
+    ax.axis("off")
+    fig.tight_layout(pad=0)
+
+    img_buffer = io.BytesIO()
+    fig.savefig(img_buffer, format='PNG', bbox_inches='tight', pad_inches=0, dpi=RENDER_DPI)
+    img_buffer.seek(0)
+    return Image.open(img_buffer)
+
+
+def fit_wordcloud(wc_obj, text='', frequencies=None, language='en', lemmatize=False):
+    """
+    Lay out a WordCloud from a frequency map when one is given (no tokenizing,
+    multi-word phrases kept intact), otherwise from raw text. Text is counted
+    by count_text, which matches WordCloud.process_text but parallelizes large inputs
+    and uses the stopwords of ``language``.
+    """
+    if frequencies:
+        return wc_obj.generate_from_frequencies(frequencies)
+    return wc_obj.generate_from_frequencies(count_text(text, language, lemmatize))
+
+
+def layout_wordcloud(data):
+    """Configure a word cloud from validated generation options and lay out its words."""
+    wc_obj = build_wordcloud(
+        data['font'],
+        data['width'],
+        data['height'],
+        data['background_color'],
+        data['max_words'],
+        data['orientation'],
+        data['word_density'] / 50,
+        data['color_scheme'],
+        data.get('seed'),
+        get_mask(data['mask_shape'], data['width'], data['height'], data.get('mask_image')),
+        data['contour_width'],
+        data['contour_color']
+    )
+    return fit_wordcloud(wc_obj, data.get('input_text', ''), data.get('frequencies'), data['language'], data['lemmatize'])
+
+
+def estimate_raster_bytes(width, height):
+    """Upper bound of the RGBA raster size render_wordcloud_image produces for a canvas."""
+    return (width * RENDER_DPI // 100) * (height * RENDER_DPI // 100) * 4
+
+
+def render_options(data):
+    """The subset of validated generation data the renderer reads, safe to pickle."""
+    return {key: data[key] for key in RENDER_OPTIONS if key in data}
+
+
+def render_generated(data):
+    """Lay out and draw a word cloud from generation options; returns the PIL Image and the layout rows."""
+    wc_obj = layout_wordcloud(data)
+    image = render_wordcloud_image(wc_obj, data['title'], data['width'], data['height'])
+    return image, layout_to_json(wc_obj.layout_)
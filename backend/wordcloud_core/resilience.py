@@ -0,0 +1,246 @@
+"""
+Failure isolation for blocking calls to upstream services (OpenAI).
+
+``ResilientCaller`` runs a callable on a small thread pool with a hard
+deadline, a circuit breaker that fails fast while the upstream error rate is
+high, and an optional hedged second attempt once the call is slower than the
+recent p95 latency (or fails early). Every caller registers itself so its
+breaker state and timings can be served as metrics.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when no attempt finished before the call deadline"""
+
+
+class CircuitBreaker:
+    """Rolling-window error-rate circuit breaker"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate=0.5, minimum_calls=5, window_seconds=60, reset_seconds=30):
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.reset_seconds = reset_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, succeeded)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow(self):
+        """Return True if a call may go upstream right now."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                # Let exactly one trial call through
+                self._trial_in_flight = True
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record(self, succeeded):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+
+            if state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if succeeded:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, succeeded))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (state == self.CLOSED and len(self._outcomes) >= self.minimum_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open(now)
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self.times_opened += 1
+
+    def metrics(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._trim(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': state,
+                'window_calls': calls,
+                'window_failures': failures,
+                'failure_rate': failures / calls if calls else 0.0,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls,
+            }
+
+
+class LatencyTracker:
+    """Keeps the most recent call latencies to derive percentiles"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[rank]
+
+
+_callers = {}
+
+
+class ResilientCaller:
+    """Deadline, circuit breaker and hedging around a blocking callable"""
+
+    def __init__(self, name, deadline, breaker=None, hedge=True, hedge_after=None,
+                 hedge_min_samples=20, max_workers=8):
+        self.name = name
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-call')
+
+        self._counter_lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedged_attempts = 0
+
+        _callers[name] = self
+
+    def _hedge_delay(self):
+        """Seconds after which a hedged attempt is launched, or None."""
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(95)
+
+    def _count(self, field):
+        with self._counter_lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def __call__(self, fn, *args, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        self._count('calls')
+        start = time.monotonic()
+        deadline_at = start + self.deadline
+        hedge_delay = self._hedge_delay()
+        hedge_at = start + hedge_delay if hedge_delay is not None and hedge_delay < self.deadline else None
+        hedged = False
+        last_error = None
+        pending = {self._executor.submit(fn, *args, **kwargs)}
+
+        while True:
+            wake_at = min(deadline_at, hedge_at) if hedge_at is not None else deadline_at
+            done, pending = wait(pending, timeout=max(0, wake_at - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    latency = time.monotonic() - start
+                    self.latencies.add(latency)
+                    self.breaker.record(True)
+                    self._count('successes')
+                    return future.result()
+                last_error = future.exception()
+
+            now = time.monotonic()
+            if now >= deadline_at:
+                break
+
+            # Hedge when the first attempt is slower than p95 or failed early
+            if self.hedge and not hedged and (not pending or (hedge_at is not None and now >= hedge_at)):
+                pending.add(self._executor.submit(fn, *args, **kwargs))
+                hedged = True
+                hedge_at = None
+                self._count('hedged_attempts')
+                continue
+
+            if not pending:
+                break
+
+        self.breaker.record(False)
+        self._count('failures')
+        if pending:
+            # Stragglers finish in the background; the client timeout bounds them
+            self._count('timeouts')
+            raise DeadlineExceeded(f"{self.name} did not answer within {self.deadline}s")
+        raise last_error
+
+    def metrics(self):
+        p50 = self.latencies.percentile(50)
+        p95 = self.latencies.percentile(95)
+        return {
+            'breaker': self.breaker.metrics(),
+            'calls': self.calls,
+            'successes': self.successes,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'hedged_attempts': self.hedged_attempts,
+            'deadline_seconds': self.deadline,
+            'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def all_metrics():
+    """Metrics for every registered caller, keyed by name."""
+    return {name: caller.metrics() for name, caller in _callers.items()}
@@ -0,0 +1,113 @@
+"""
+Full-text search over word cloud titles and input texts.
+
+On PostgreSQL each row has a ``search_vector`` tsvector column (title
+weighted above text) behind a GIN index. On SQLite a
+``wordcloud_core_wordcloud_fts`` FTS5 table is keyed by the cloud's id.
+Both are created by migration 0009 and kept up to date from the
+post_save/post_delete signals below, so the ORM never loads them. Other
+databases fall back to unindexed ``icontains`` matching.
+
+Only the first SEARCH_TEXT_LIMIT characters of a text are indexed: input
+texts can be megabytes, and PostgreSQL refuses tsvectors over 1 MB.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DataError, connections, transaction
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'wordcloud_core_wordcloud'
+FTS_TABLE = 'wordcloud_core_wordcloud_fts'
+
+# Characters of a text that are searchable (migration 0009 backfills with the same limit)
+SEARCH_TEXT_LIMIT = 100000
+
+# setweight(title, 'A') || setweight(input_text, 'B'), from two text parameters
+PG_VECTOR = (
+    "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'B')"
+)
+
+
+def _pg_vector_params(title, text):
+    config = settings.WORDCLOUD_SEARCH_CONFIG
+    return [config, title or '', config, (text or '')[:SEARCH_TEXT_LIMIT]]
+
+
+def _fts_query(query):
+    """Quote every word so user input cannot be read as FTS5 query syntax; all words must match."""
+    return ' '.join('"%s"' % word for word in re.findall(r'\w+', query))
+
+
+def index_wordcloud(wordcloud, using='default'):
+    """Store the search terms of one saved WordCloud."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            try:
+                # Savepoint, so a refused vector does not abort the caller's transaction
+                with transaction.atomic(using=using):
+                    cursor.execute(
+                        f"UPDATE {TABLE} SET search_vector = {PG_VECTOR} WHERE id = %s",
+                        _pg_vector_params(wordcloud.title, wordcloud.input_text) + [wordcloud.pk]
+                    )
+            except DataError as e:
+                logger.warning("Indexing only the title of word cloud %s: %s", wordcloud.pk, e)
+                cursor.execute(
+                    f"UPDATE {TABLE} SET search_vector = {PG_VECTOR} WHERE id = %s",
+                    _pg_vector_params(wordcloud.title, '') + [wordcloud.pk]
+                )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, input_text) VALUES (%s, %s, %s)",
+                [wordcloud.pk, wordcloud.title, wordcloud.input_text[:SEARCH_TEXT_LIMIT]]
+            )
+
+
+def unindex_wordcloud(pk, using='default'):
+    """Drop the search terms of a deleted WordCloud."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def search_wordclouds(queryset, query):
+    """
+    Narrow a WordCloud queryset to clouds matching ``query`` and order them
+    by relevance (annotated as ``rank``, higher is better), newest first on ties.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        params = [settings.WORDCLOUD_SEARCH_CONFIG, query]
+        queryset = queryset.filter(
+            RawSQL(f"{TABLE}.search_vector @@ {tsquery}", params, output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f"ts_rank({TABLE}.search_vector, {tsquery})", params, output_field=FloatField())
+        )
+    elif vendor == 'sqlite':
+        match = _fts_query(query)
+        if not match:
+            return queryset.none()
+        queryset = queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            # bm25() is lower for better matches; titles weigh ten times more than text
+            rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {TABLE}.id",
+                [match], output_field=FloatField()
+            )
+        )
+    else:
+        # Externalized texts only match on their inline prefix here
+        queryset = queryset.filter(
+            Q(title__icontains=query) | Q(inline_text__icontains=query)
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-rank', '-updated_at', '-id')
@@ -1,25 +1,111 @@
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from PIL import ImageColor
 from rest_framework import serializers
+from wordcloud_core.masks import MASK_CHOICES
 from wordcloud_core.models import WordCloud, UserCredit
 
+# Upper bound on words accepted in a frequency map
+MAX_FREQUENCY_ENTRIES = 5000
+
+# Characters of input_text returned as the preview in list responses
+INPUT_PREVIEW_LENGTH = 200
+
+
+def validate_color(value):
+    """Reject colors PIL cannot draw, so rendering does not fail later"""
+    try:
+        ImageColor.getrgb(value)
+    except ValueError:
+        raise serializers.ValidationError(f'"{value}" is not a valid color.')
+    return value
+
+
+def validate_frequency_map(value):
+    """Drop blank words and zero weights, and cap the number of entries"""
+    frequencies = {word.strip(): weight for word, weight in value.items() if word.strip() and weight > 0}
+    if not frequencies:
+        raise serializers.ValidationError('At least one word needs a positive weight.')
+    if len(frequencies) > MAX_FREQUENCY_ENTRIES:
+        raise serializers.ValidationError(f'At most {MAX_FREQUENCY_ENTRIES} words are allowed.')
+    return frequencies
+
 
 class WordCloudSerializer(serializers.ModelSerializer):
     """Serializer for WordCloud model"""
+    # Model property over inline or compressed storage
+    input_text = serializers.CharField(required=False, allow_blank=True, style={'base_template': 'textarea.html'})
+    # Validated like generation requests, so restyle and export can draw it
+    frequencies = serializers.DictField(child=serializers.FloatField(min_value=0), required=False, allow_null=True)
 
     class Meta:
         model = WordCloud
         fields = [
-            'id', 'title', 'input_text', 'is_ai_generated',
+            'id', 'title', 'input_text', 'frequencies', 'is_ai_generated',
             'width', 'height', 'font', 'color_scheme', 'background_color',
-            'max_words', 'word_density', 'orientation',
+            'max_words', 'word_density', 'orientation', 'language', 'lemmatize', 'seed',
+            'mask_shape', 'contour_width', 'contour_color',
             'image_url', 'svg_url', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'image_url', 'svg_url', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'mask_shape', 'image_url', 'svg_url', 'created_at', 'updated_at']
+
+    def validate_frequencies(self, value):
+        return value if value is None else validate_frequency_map(value)
+
+    def validate(self, attrs):
+        """A cloud needs words: input_text or frequencies, after this update"""
+        if 'input_text' in attrs:
+            has_text = bool(attrs['input_text'])
+        else:
+            # The inline prefix is empty exactly when the text is, without loading a blob
+            has_text = bool(self.instance and self.instance.inline_text)
+        frequencies = attrs['frequencies'] if 'frequencies' in attrs else getattr(self.instance, 'frequencies', None)
+        if not has_text and not frequencies:
+            raise serializers.ValidationError('Provide either input_text or frequencies.')
+        return attrs
+
+    def validate_background_color(self, value):
+        return validate_color(value)
+
+    def validate_contour_color(self, value):
+        return validate_color(value)
+
+
+class WordCloudListSerializer(serializers.ModelSerializer):
+    """
+    Compact WordCloud representation for list responses. ``input_preview`` is
+    the start of input_text, annotated by the view; pass ``fields`` to return
+    a sparse fieldset.
+    """
+    input_preview = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = WordCloud
+        fields = [
+            'id', 'title', 'input_preview', 'is_ai_generated',
+            'width', 'height', 'font', 'color_scheme', 'background_color',
+            'language', 'mask_shape', 'image_url', 'svg_url', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
 class WordCloudGenerateSerializer(serializers.Serializer):
     """Serializer for word cloud generation request"""
     title = serializers.CharField(max_length=100)
-    input_text = serializers.CharField()
+    input_text = serializers.CharField(required=False, allow_blank=True)
+    # Pre-weighted words ({"word or phrase": weight}); rendered without tokenizing
+    frequencies = serializers.DictField(
+        child=serializers.FloatField(min_value=0),
+        required=False,
+        allow_empty=False
+    )
     is_ai_generated = serializers.BooleanField(default=False)
     width = serializers.IntegerField(min_value=100, max_value=2000, default=800)
     height = serializers.IntegerField(min_value=100, max_value=2000, default=400)
@@ -29,6 +115,65 @@ class WordCloudGenerateSerializer(serializers.Serializer):
     max_words = serializers.IntegerField(min_value=10, max_value=1000, default=200)
     word_density = serializers.IntegerField(min_value=10, max_value=100, default=80)
     orientation = serializers.ChoiceField(choices=WordCloud.ORIENTATION_CHOICES, default='random')
+    language = serializers.ChoiceField(choices=WordCloud.LANGUAGE_CHOICES, default='en')
+    lemmatize = serializers.BooleanField(default=False)
+    # Layout seed; a random one is picked when omitted
+    seed = serializers.IntegerField(min_value=0, max_value=2 ** 31 - 1, required=False)
+    # Stock shape, or an uploaded image whose dark pixels form the shape
+    mask_shape = serializers.ChoiceField(choices=MASK_CHOICES, default='none')
+    mask_image = serializers.ImageField(required=False, write_only=True)
+    contour_width = serializers.IntegerField(min_value=0, max_value=20, default=0)
+    contour_color = serializers.CharField(max_length=20, default='black')
+
+    def validate_frequencies(self, value):
+        return validate_frequency_map(value)
+
+    def validate_background_color(self, value):
+        return validate_color(value)
+
+    def validate_contour_color(self, value):
+        return validate_color(value)
+
+    def validate_mask_image(self, value):
+        if value.size > settings.WORDCLOUD_MAX_MASK_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f'Mask image is too large. The limit is {settings.WORDCLOUD_MAX_MASK_UPLOAD_SIZE // (1024 * 1024)} MB.'
+            )
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('input_text') and not attrs.get('frequencies'):
+            raise serializers.ValidationError('Provide either input_text or frequencies.')
+        return self.validate_mask(attrs)
+
+    def validate_mask(self, attrs):
+        """An uploaded mask image implies the 'custom' shape, which needs one"""
+        if attrs.get('mask_image'):
+            attrs['mask_shape'] = 'custom'
+        elif attrs.get('mask_shape') == 'custom':
+            raise serializers.ValidationError({'mask_image': 'Upload an image for a custom mask.'})
+        return attrs
+
+
+class WordCloudStreamGenerateSerializer(WordCloudGenerateSerializer):
+    """Serializer for generating a word cloud from large text or an uploaded file"""
+    file = serializers.FileField(required=False)
+    # 'approximate' counts with a fixed-size heavy-hitters summary for huge vocabularies
+    frequency_mode = serializers.ChoiceField(choices=['exact', 'approximate'], default='exact')
+    # Maximum over-count as a fraction of all words (approximate mode only)
+    error_bound = serializers.FloatField(min_value=0.00001, max_value=0.1, default=0.0001)
+
+    def validate_file(self, value):
+        if value.size > settings.WORDCLOUD_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f'File is too large. The limit is {settings.WORDCLOUD_MAX_UPLOAD_SIZE // (1024 * 1024)} MB.'
+            )
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('input_text') and not attrs.get('file'):
+            raise serializers.ValidationError('Provide either input_text or file.')
+        return self.validate_mask(attrs)
 
 
 class WordCloudExportSerializer(serializers.Serializer):
@@ -44,9 +189,47 @@ class AIWordSuggestionsSerializer(serializers.Serializer):
 
 
 class UserCreditSerializer(serializers.ModelSerializer):
-    """Serializer for user credits"""
+    """Serializer for user credits from credits.with_balance or user_cache.get_credits"""
+    credits_remaining = serializers.IntegerField(source='balance', read_only=True)
+    last_updated = serializers.DateTimeField(source='last_activity', read_only=True)
 
     class Meta:
         model = UserCredit
         fields = ['credits_remaining', 'last_updated']
         read_only_fields = ['credits_remaining', 'last_updated']
+
+
+class OnboardUserSerializer(serializers.Serializer):
+    """
+    One user to create in a bulk onboarding request. Passwords must come
+    hashed; hashing plain ones in the request would take minutes for large
+    imports, which belong in the onboard_users command. That command sets
+    ``plain_passwords`` in the context to accept ``password`` as well.
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True)
+    password_hash = serializers.CharField(max_length=128, required=False, write_only=True)
+    password = serializers.CharField(required=False, write_only=True, trim_whitespace=False)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and 'password' in data and not self.context.get('plain_passwords'):
+            raise serializers.ValidationError({
+                'password': 'Plain passwords are not accepted here. Send password_hash, '
+                            'or use the onboard_users management command.'
+            })
+        return super().to_internal_value(data)
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError('Not a password hash produced by a configured hasher.')
+        return value
+
+
+class BulkOnboardSerializer(serializers.Serializer):
+    """Serializer for bulk user onboarding requests"""
+    users = OnboardUserSerializer(many=True, allow_empty=False, max_length=settings.WORDCLOUD_ONBOARD_MAX_USERS)
+    # Starting AI credits; the UserCredit default when omitted
+    credits = serializers.IntegerField(min_value=0, required=False)
+    batch_size = serializers.IntegerField(min_value=1, max_value=10000, default=1000)
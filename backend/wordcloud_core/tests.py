@@ -1,9 +1,35 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import WordCloud, UserCredit, UserProfile
+from PIL import Image
+from wordcloud import WordCloud as WC
+
+from . import checks, credits, db_router, fonts, local_suggestions, masks, onboarding, raster_transport, user_cache
+from .models import CreditLedgerEntry, TextBlob, WordCloud, UserCredit, UserProfile
+from .rendering import CachedWordCloud, build_wordcloud, render_generated, render_wordcloud_image
+from .text_processing import SpaceSaving, count_text, get_stopwords, lemmatize, stream_frequencies
+from .serializers import INPUT_PREVIEW_LENGTH
+from .resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientCaller
 
 class WordCloudAPITest(TestCase):
     def setUp(self):
@@ -290,4 +316,1500 @@ class WordCloudModelTest(TestCase):
 
     def test_word_cloud_str_method(self):
         """Test the string representation of a WordCloud"""
-        self.assertEqual(str(self.word_cloud), 'Test Word Cloud')
\ No newline at end of file
+        self.assertEqual(str(self.word_cloud), 'Test Word Cloud')
+
+
+class LocalSuggestionIndexTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Build a small index from past word clouds
+        for text in [
+            'Python programming with Django and REST APIs',
+            'Django templates, Python views and REST serializers',
+            'Ocean waves, sandy beach and summer sun',
+        ]:
+            WordCloud.objects.create(user=self.user, title='Corpus', input_text=text)
+
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir)
+        local_suggestions.build_index(
+            lambda: WordCloud.objects.iter_input_texts(),
+            self.index_dir
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.suggestions_url = reverse('ai-word-suggestions')
+
+    def test_related_words(self):
+        """Test that the index returns co-occurring words first"""
+        index = local_suggestions.get_index(self.index_dir)
+        words = index.related('python', 3)
+        self.assertEqual(len(words), 3)
+        self.assertIn('django', words)
+        self.assertNotIn('python', words)
+        self.assertNotIn('beach', words)
+
+    def test_unknown_topic(self):
+        """Test that a topic the index does not know gets no suggestions rather than common words"""
+        index = local_suggestions.get_index(self.index_dir)
+        self.assertEqual(index.related('quantum physics', 3), [])
+
+        with override_settings(AI_SUGGESTIONS_SOURCE='local', LOCAL_SUGGESTIONS_INDEX_DIR=self.index_dir):
+            response = self.client.post(self.suggestions_url, {'topic': 'quantum physics', 'count': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(credits.remaining(self.user), 3)
+
+        # In fallback mode the upstream error is reported and the credit refunded
+        with override_settings(AI_SUGGESTIONS_SOURCE='fallback', LOCAL_SUGGESTIONS_INDEX_DIR=self.index_dir), \
+                patch('wordcloud_core.views.run_prompt_gpt4mini', side_effect=CircuitOpenError('openai')):
+            response = self.client.post(self.suggestions_url, {'topic': 'quantum physics', 'count': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(credits.remaining(self.user), 3)
+
+    def test_local_suggestions_view(self):
+        """Test serving suggestions from the local index only"""
+        with override_settings(AI_SUGGESTIONS_SOURCE='local', LOCAL_SUGGESTIONS_INDEX_DIR=self.index_dir):
+            response = self.client.post(self.suggestions_url, {'topic': 'beach', 'count': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['source'], 'local')
+        self.assertIn('ocean', response.data['words'])
+        self.assertEqual(response.data['credits_remaining'], 2)
+
+
+class ResilientCallerTest(TestCase):
+    def failing_call(self):
+        raise ConnectionError('upstream down')
+
+    def test_breaker_opens_and_fails_fast(self):
+        """Test that repeated failures open the breaker and stop upstream calls"""
+        caller = ResilientCaller(
+            'test-breaker', deadline=1, hedge=False,
+            breaker=CircuitBreaker(failure_rate=0.5, minimum_calls=3, reset_seconds=60)
+        )
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                caller(self.failing_call)
+
+        with self.assertRaises(CircuitOpenError):
+            caller(self.failing_call)
+        metrics = caller.metrics()
+        self.assertEqual(metrics['breaker']['state'], CircuitBreaker.OPEN)
+        self.assertEqual(metrics['breaker']['rejected_calls'], 1)
+        self.assertEqual(metrics['calls'], 3)
+
+    def test_breaker_half_open_recovers(self):
+        """Test that a successful trial call closes the breaker again"""
+        breaker = CircuitBreaker(failure_rate=0.5, minimum_calls=1, reset_seconds=0)
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # Only one trial at a time
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_deadline(self):
+        """Test that slow calls are abandoned at the deadline"""
+        caller = ResilientCaller('test-deadline', deadline=0.05, hedge=False)
+        with self.assertRaises(DeadlineExceeded):
+            caller(time.sleep, 0.5)
+        self.assertEqual(caller.metrics()['timeouts'], 1)
+
+    def test_hedged_attempt(self):
+        """Test that a slow first attempt is hedged by a faster second one"""
+        delays = [0.5, 0.0]
+
+        def call():
+            time.sleep(delays.pop(0))
+            return 'ok'
+
+        caller = ResilientCaller('test-hedge', deadline=0.3, hedge_after=0.02)
+        self.assertEqual(caller(call), 'ok')
+        self.assertEqual(caller.metrics()['hedged_attempts'], 1)
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class WordCloudFrequenciesTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+
+    def test_generate_from_frequencies(self, mock_upload):
+        """Test generating a word cloud from a frequency map instead of text"""
+        data = {
+            'title': 'Weighted Cloud',
+            'frequencies': {'machine learning': 5, 'data': 2, 'models': 1},
+            'color_scheme': 'Blues',
+        }
+        response = self.client.post(self.generate_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['frequencies'], data['frequencies'])
+        self.assertEqual(response.data['input_text'], '')
+        mock_upload.assert_called_once()
+
+        # Exporting renders from the stored frequencies, keeping phrases whole
+        export_url = reverse('wordcloud-export', args=[response.data['id']])
+        export = self.client.post(export_url, {'format': 'svg'}, format='json')
+        self.assertEqual(export.status_code, status.HTTP_200_OK)
+        self.assertIn('machine learning', export.content.decode())
+
+    def test_generate_requires_text_or_frequencies(self, mock_upload):
+        """Test that a request without text or frequencies is rejected"""
+        response = self.client.post(self.generate_url, {'title': 'Empty'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_upload.assert_not_called()
+
+
+class StreamingFrequencyTest(TestCase):
+    text = (
+        "Cats and dogs. The cat's toy, the dog's bone; cats chase 42 mice.\n"
+        "Naïve Dogs run while CATS sleep and cat naps happen."
+    ) * 50
+
+    def test_matches_wordcloud_tokenizer(self):
+        """Test that chunked counting matches WordCloud.process_text at any chunk size"""
+        expected = WC(collocations=False).process_text(self.text)
+        for chunk_size in (1, 7, 64, len(self.text)):
+            self.assertEqual(stream_frequencies(self.text, 200, chunk_size=chunk_size), expected)
+
+    def test_binary_file_source(self):
+        """Test decoding a byte stream with multi-byte characters split across chunks"""
+        upload = SimpleUploadedFile('corpus.txt', self.text.encode('utf-8'))
+        expected = WC(collocations=False).process_text(self.text)
+        self.assertEqual(stream_frequencies(upload, 200, chunk_size=5), expected)
+
+    def test_top_n(self):
+        """Test that only the requested number of words is returned"""
+        frequencies = stream_frequencies(self.text, 2)
+        self.assertEqual(list(frequencies), ['cat', 'dog'])
+
+    def test_vocabulary_overflow_keeps_error_bound(self):
+        """Test that counting past the distinct word limit over-counts by at most words seen / limit"""
+        rare = ' '.join(f"rare{i}" for i in range(400))
+        text = ('alpha ' * 300 + 'beta ' * 200 + rare + ' ') * 3
+        with override_settings(WORDCLOUD_STREAM_MAX_DISTINCT_WORDS=100):
+            frequencies = stream_frequencies(text, 2, chunk_size=256)
+        self.assertEqual(list(frequencies), ['alpha', 'beta'])
+        max_error = len(text.split()) / 100
+        self.assertLessEqual(abs(frequencies['alpha'] - 900), max_error)
+        self.assertLessEqual(abs(frequencies['beta'] - 600), max_error)
+
+
+class ParallelCountTest(TestCase):
+    text = ' '.join(
+        ['New York', 'city', 'Cities', 'the', 'data', 'Data', "science's", '2024', 'of', 'New', 'cats', 'Cat'][i % 12]
+        for i in range(0, 6000, 7)
+    ) * 20
+
+    def test_sequential_matches_wordcloud(self):
+        """Test that counting reproduces WordCloud.process_text, collocations and order included"""
+        expected = WC().process_text(self.text)
+        result = count_text(self.text, workers=1)
+        self.assertEqual(list(result.items()), list(expected.items()))
+        self.assertIn('New York', result)
+
+    def test_parallel_matches_sequential(self):
+        """Test that map-reduce counting in a process pool gives identical results"""
+        expected = count_text(self.text, workers=1)
+        result = count_text(self.text, workers=2, min_parallel_chars=0)
+        self.assertEqual(list(result.items()), list(expected.items()))
+
+
+class SpaceSavingTest(TestCase):
+    def test_error_bound(self):
+        """Test that estimates stay within the guaranteed error and memory stays fixed"""
+        stream = [f'w{i % 7}' if i % 3 else f'rare{i}' for i in range(3000)]
+        exact = {}
+        summary = SpaceSaving(capacity=20)
+        for start in range(0, len(stream), 100):
+            batch = {}
+            for word in stream[start:start + 100]:
+                batch[word] = batch.get(word, 0) + 1
+                exact[word] = exact.get(word, 0) + 1
+            summary.update(batch)
+
+        self.assertLessEqual(len(summary.counts), 20)
+        for word, estimate in summary.counts.items():
+            self.assertGreaterEqual(estimate, exact[word])
+            self.assertLessEqual(estimate - exact[word], summary.max_error)
+        # Every frequent word is still monitored
+        top_words = {word for word, _ in summary.most_common(7)}
+        self.assertEqual(top_words, {f'w{i}' for i in range(7)})
+
+    def test_approximate_stream_frequencies(self):
+        """Test that approximate mode finds the same heavy hitters as exact counting"""
+        text = ' '.join(['alpha'] * 50 + ['beta'] * 30 + ['gamma'] * 20 + [f'noise{i}' for i in range(500)])
+        frequencies = stream_frequencies(text, 3, chunk_size=64, error_bound=0.01)
+        self.assertEqual(list(frequencies), ['alpha', 'beta', 'gamma'])
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class StreamGenerateWordCloudTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.stream_url = reverse('wordcloud-generate-stream')
+
+    def test_generate_from_upload(self, mock_upload):
+        """Test generating a word cloud from a multipart file upload"""
+        upload = SimpleUploadedFile('corpus.txt', b'clouds rain clouds sun clouds rain wind ' * 1000)
+        data = {'title': 'Uploaded', 'file': upload, 'max_words': 10, 'color_scheme': 'Greens'}
+        response = self.client.post(self.stream_url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['frequencies'], {'clouds': 3000, 'rain': 2000, 'sun': 1000, 'wind': 1000})
+        self.assertEqual(response.data['input_text'], '')
+
+    @override_settings(WORDCLOUD_RENDER_WORKERS=1, FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_generate_from_upload_in_render_worker(self, mock_upload):
+        """Test that a render worker only gets the render options, not the uploaded file"""
+        self.addCleanup(raster_transport.shutdown_render_pool)
+        # Larger than FILE_UPLOAD_MAX_MEMORY_SIZE, so it is spooled to an unpicklable temporary file
+        upload = SimpleUploadedFile('corpus.txt', b'clouds rain clouds sun clouds rain wind ' * 1000)
+        data = {'title': 'Uploaded', 'file': upload, 'max_words': 10, 'width': 200, 'height': 100}
+        response = self.client.post(self.stream_url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['frequencies'], {'clouds': 3000, 'rain': 2000, 'sun': 1000, 'wind': 1000})
+        self.assertIsNotNone(raster_transport._render_pool)
+
+    def test_upload_without_words(self, mock_upload):
+        """Test that input with only stopwords is rejected"""
+        upload = SimpleUploadedFile('corpus.txt', b'the and of 123')
+        response = self.client.post(self.stream_url, {'title': 'Empty', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_upload.assert_not_called()
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class LanguageProcessingTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+
+    def test_language_stopwords(self, mock_upload):
+        """Test that each language uses its own stopword list"""
+        text = 'el gato y el perro de la casa the cat'
+        self.assertEqual(set(count_text(text, 'es')), {'gato', 'perro', 'casa', 'the', 'cat'})
+        self.assertIs(get_stopwords('es'), get_stopwords('es'))
+
+    def test_lemmatize(self, mock_upload):
+        """Test that regular plurals are reduced to the singular"""
+        self.assertEqual(lemmatize('cities'), 'city')
+        self.assertEqual(lemmatize('boxes'), 'box')
+        self.assertEqual(lemmatize('clouds'), 'cloud')
+        self.assertEqual(lemmatize('glass'), 'glass')
+        self.assertEqual(lemmatize('casas', 'es'), 'casa')
+        counts = count_text('clouds cloud clouds', lemmatize_words=True)
+        self.assertEqual(counts, {'cloud': 3})
+        self.assertEqual(lemmatize('series'), 'series')
+        self.assertEqual(lemmatize('news'), 'news')
+
+    def test_lemmatize_keeps_stopwords_out(self, mock_upload):
+        """Test that stopwords are dropped even when their lemma is not a stopword"""
+        counts = count_text('Does it matter? themselves, ourselves and yourselves', lemmatize_words=True)
+        self.assertEqual(counts, {'matter': 1})
+        counts = count_text('nosotros y vosotros con algunos gatos', 'es', lemmatize_words=True)
+        self.assertEqual(counts, {'gato': 1})
+
+    def test_generate_with_language(self, mock_upload):
+        """Test generating a word cloud with Spanish stopwords and lemmatization"""
+        data = {
+            'title': 'Spanish',
+            'input_text': 'las casas de la ciudad y la casa del campo',
+            'color_scheme': 'Greens',
+            'language': 'es',
+            'lemmatize': True
+        }
+        response = self.client.post(self.generate_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        wordcloud = WordCloud.objects.get(id=response.data['id'])
+        self.assertEqual(wordcloud.language, 'es')
+        self.assertTrue(wordcloud.lemmatize)
+
+
+class FontCacheTest(TestCase):
+    def setUp(self):
+        self.frequencies = count_text('clouds rain sun wind storm thunder lightning ' * 20 + 'clouds rain sun')
+
+    def test_missing_font_falls_back(self):
+        """Test that fonts missing from the fonts directory resolve to the default font"""
+        with tempfile.TemporaryDirectory() as fonts_dir:
+            with override_settings(WORDCLOUD_FONTS_DIR=fonts_dir):
+                paths = fonts.load_fonts()
+        self.assertEqual(set(paths), {font for font, _ in WordCloud.FONT_CHOICES})
+        self.assertEqual(fonts.get_font_path('arial'), WC().font_path)
+        fonts.load_fonts()
+
+    def test_cached_layout_matches_wordcloud(self):
+        """Test that the cached renderer produces the same layout and pixels as WordCloud"""
+        options = {'width': 300, 'height': 150, 'prefer_horizontal': 0.5, 'random_state': 7}
+        expected = WC(**options).generate_from_frequencies(self.frequencies)
+        cached = CachedWordCloud(**options).generate_from_frequencies(self.frequencies)
+        self.assertEqual(cached.layout_, expected.layout_)
+        self.assertEqual(cached.to_image().tobytes(), expected.to_image().tobytes())
+        self.assertGreater(fonts.cache_info()['text_metrics']['hits'], 0)
+
+    def test_sprite_cache_is_bounded(self):
+        """Test that sprites are reused and evicted to stay within the byte budget"""
+        cache = fonts.SpriteCache(max_bytes=2000)
+        path = fonts.get_font_path('arial')
+        first = cache.get('cloud', path, 20)
+        self.assertIs(cache.get('cloud', path, 20), first)
+        for size in range(20, 60, 5):
+            cache.get('storm', path, size)
+        self.assertLessEqual(cache.size_bytes, 2000)
+        self.assertEqual(cache.info()['hits'], 1)
+
+    def test_concurrent_renders_match(self):
+        """Test that renders running in parallel threads match sequential renders"""
+        def render(seed):
+            wc_obj = build_wordcloud('arial', 300, 150, 'white', 50, 'random', 1, 'Greens', seed)
+            wc_obj.generate_from_frequencies(self.frequencies)
+            return render_wordcloud_image(wc_obj, f'Cloud {seed}', 300, 150).tobytes()
+
+        expected = [render(seed) for seed in range(6)]
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            self.assertEqual(list(executor.map(render, range(6))), expected)
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class RestyleWordCloudTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+
+    def _generate(self):
+        data = {
+            'title': 'Weather',
+            'input_text': 'clouds rain sun wind storm clouds rain clouds thunder',
+            'color_scheme': 'Greens'
+        }
+        response = self.client.post(self.generate_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return WordCloud.objects.get(id=response.data['id'])
+
+    def test_generate_stores_layout(self, mock_upload):
+        """Test that generating a word cloud stores its layout"""
+        wordcloud = self._generate()
+        self.assertEqual({row[0] for row in wordcloud.layout}, {'clouds', 'rain', 'sun', 'wind', 'storm', 'thunder'})
+
+    def test_style_change_reuses_layout(self, mock_upload):
+        """Test that changing the color scheme recolors the stored layout and re-uploads the image"""
+        wordcloud = self._generate()
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        with patch('wordcloud_core.views.fit_wordcloud') as mock_fit, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(detail_url, {'color_scheme': 'Blues'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['color_scheme'], 'Blues')
+        mock_fit.assert_not_called()
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"color_scheme"', updates[0])
+        self.assertNotIn('"input_text"', updates[0])
+        self.assertEqual(mock_upload.call_count, 2)
+
+        restyled = WordCloud.objects.get(id=wordcloud.id)
+        self.assertEqual(restyled.color_scheme, 'Blues')
+        self.assertEqual([row[:6] for row in restyled.layout], [row[:6] for row in wordcloud.layout])
+
+    def test_other_change_does_not_render(self, mock_upload):
+        """Test that non-style changes do not re-render the image"""
+        wordcloud = self._generate()
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        response = self.client.patch(detail_url, {'title': 'Renamed', 'color_scheme': 'Greens'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_upload.call_count, 1)
+
+    def test_invalid_color_rejected(self, mock_upload):
+        """Test that colors PIL cannot draw are rejected before anything is rendered"""
+        wordcloud = self._generate()
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        response = self.client.patch(detail_url, {'background_color': 'notacolor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('background_color', response.data)
+        response = self.client.patch(detail_url, {'contour_color': '#12'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(mock_upload.call_count, 1)
+
+    def test_frequencies_validated_on_update(self, mock_upload):
+        """Test that frequency maps written through the detail endpoint are validated like generation requests"""
+        wordcloud = self._generate()
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        for frequencies in ({'sun': -1}, {'sun': 'many'}, {' ': 2, 'rain': 0}, ['sun', 'rain']):
+            response = self.client.patch(detail_url, {'frequencies': frequencies}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, frequencies)
+            self.assertIn('frequencies', response.data)
+
+        response = self.client.patch(detail_url, {'frequencies': {' sun ': 3, 'rain': 0, 'wind': 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(WordCloud.objects.get(id=wordcloud.id).frequencies, {'sun': 3, 'wind': 1})
+
+    def test_restyle_upload_failure(self, mock_upload):
+        """Test that a failed upload while restyling returns an error and keeps the old style"""
+        wordcloud = self._generate()
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        mock_upload.side_effect = OSError('storage unavailable')
+        response = self.client.patch(detail_url, {'background_color': '#000000'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn('storage unavailable', response.data['detail'])
+        self.assertEqual(WordCloud.objects.get(id=wordcloud.id).background_color, 'white')
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class SeededLayoutTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+        self.data = {
+            'title': 'Weather',
+            'input_text': 'clouds rain sun wind storm clouds rain clouds thunder lightning hail snow',
+            'color_scheme': 'Greens',
+            'width': 300,
+            'height': 200
+        }
+
+    def _export(self, wordcloud, resolution):
+        export_url = reverse('wordcloud-export', args=[wordcloud.id])
+        response = self.client.post(export_url, {'format': 'png', 'resolution': resolution}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content
+
+    def test_same_seed_same_layout(self, mock_upload):
+        """Test that generating twice with the same seed gives the same layout"""
+        first = self.client.post(self.generate_url, {**self.data, 'seed': 42}, format='json')
+        second = self.client.post(self.generate_url, {**self.data, 'seed': 42}, format='json')
+        self.assertEqual(first.data['seed'], 42)
+        layouts = [WordCloud.objects.get(id=r.data['id']).layout for r in (first, second)]
+        self.assertEqual(layouts[0], layouts[1])
+
+    def test_seed_is_assigned(self, mock_upload):
+        """Test that a seed is picked and stored when none is given"""
+        response = self.client.post(self.generate_url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNotNone(response.data['seed'])
+
+    def test_export_is_reproducible(self, mock_upload):
+        """Test that exports are byte-identical and scale the stored layout"""
+        response = self.client.post(self.generate_url, self.data, format='json')
+        wordcloud = WordCloud.objects.get(id=response.data['id'])
+        self.assertEqual(self._export(wordcloud, 'low'), self._export(wordcloud, 'low'))
+
+        # Without the stored layout the seed reproduces it
+        stored = self._export(wordcloud, 'medium')
+        WordCloud.objects.filter(id=wordcloud.id).update(layout=None)
+        wordcloud.refresh_from_db()
+        self.assertEqual(self._export(wordcloud, 'medium'), stored)
+
+        low = Image.open(io.BytesIO(self._export(wordcloud, 'low')))
+        medium = Image.open(io.BytesIO(stored))
+        self.assertEqual(medium.size, (low.size[0] * 2, low.size[1] * 2))
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class MaskedWordCloudTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+        self.data = {
+            'title': 'Shaped',
+            'input_text': 'clouds rain sun wind storm clouds rain clouds thunder lightning hail snow',
+            'color_scheme': 'Greens',
+            'width': 300,
+            'height': 200
+        }
+
+    def _assert_inside(self, wordcloud, mask):
+        for word, _, font_size, x, y, orientation, _ in wordcloud.layout:
+            self.assertFalse(mask.boolean[x, y], word)
+
+    def test_stock_mask_is_cached(self, mock_upload):
+        """Test that stock masks are preprocessed once per size"""
+        mask = masks.get_stock_mask('heart', 300, 200)
+        self.assertIs(masks.get_mask('heart', 300, 200), mask)
+        self.assertEqual(mask.image.shape, (200, 300))
+        self.assertTrue(mask.boolean[0, 0])
+        self.assertFalse(mask.boolean[100, 150])
+        self.assertFalse(mask.integral.flags.writeable)
+        self.assertIsNone(masks.get_mask('none', 300, 200))
+
+    def test_generate_with_stock_mask(self, mock_upload):
+        """Test that words are placed inside a stock shape"""
+        response = self.client.post(self.generate_url, {**self.data, 'mask_shape': 'circle', 'contour_width': 2},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['mask_shape'], 'circle')
+        wordcloud = WordCloud.objects.get(id=response.data['id'])
+        self._assert_inside(wordcloud, masks.get_stock_mask('circle', 300, 200))
+
+        export_url = reverse('wordcloud-export', args=[wordcloud.id])
+        response = self.client.post(export_url, {'format': 'png', 'resolution': 'low'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_generate_with_mask_image(self, mock_upload):
+        """Test that an uploaded image is stored as a custom mask"""
+        image = Image.new('RGB', (60, 40), 'white')
+        image.paste((0, 0, 0), (0, 0, 30, 40))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        upload = SimpleUploadedFile('mask.png', buffer.getvalue(), content_type='image/png')
+
+        response = self.client.post(self.generate_url, {**self.data, 'mask_image': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['mask_shape'], 'custom')
+        wordcloud = WordCloud.objects.get(id=response.data['id'])
+        mask = masks.get_mask('custom', 300, 200, wordcloud.mask_image)
+        self.assertTrue(mask.boolean[:, 160:].all())
+        self._assert_inside(wordcloud, mask)
+
+        # Resizing the canvas resizes the stored mask with it
+        detail_url = reverse('wordcloud-detail', args=[wordcloud.id])
+        response = self.client.patch(detail_url, {'width': 600}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        wordcloud = WordCloud.objects.get(id=wordcloud.id)
+        self.assertIsNone(wordcloud.layout)
+        mask = masks.get_mask('custom', 600, 200, wordcloud.mask_image)
+        self.assertEqual(mask.boolean.shape, (200, 600))
+        self.assertTrue(mask.boolean[:, 320:].all())
+        self.assertFalse(mask.boolean[:, :280].any())
+
+    def test_custom_mask_requires_image(self, mock_upload):
+        """Test that the custom shape is rejected without an image"""
+        response = self.client.post(self.generate_url, {**self.data, 'mask_shape': 'custom'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WordCloudLayoutTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Create a test word cloud
+        self.word_cloud = WordCloud.objects.create(
+            user=self.user,
+            title='Test Word Cloud',
+            input_text='clouds rain sun wind storm clouds rain clouds thunder',
+            is_ai_generated=False
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URLs
+        self.preview_url = reverse('wordcloud-layout-preview')
+        self.layout_url = reverse('wordcloud-layout', args=[self.word_cloud.id])
+
+    @patch('wordcloud_core.views.save_pil_image_to_azure')
+    def test_preview_layout(self, mock_upload):
+        """Test that the preview endpoint returns a layout without rendering or saving"""
+        data = {
+            'title': 'Preview',
+            'input_text': 'clouds rain sun wind storm clouds rain clouds thunder',
+            'color_scheme': 'Greens',
+            'seed': 3
+        }
+        response = self.client.post(self.preview_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['seed'], 3)
+        self.assertEqual(response.data['words'][0][0], 'clouds')
+        self.assertEqual(len(response.data['words'][0]), 6)
+        mock_upload.assert_not_called()
+        self.assertEqual(WordCloud.objects.count(), 1)
+
+    def test_saved_layout(self):
+        """Test that a saved word cloud's layout is computed once and reused"""
+        response = self.client.get(self.layout_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({row[0] for row in response.data['words']}, {'clouds', 'rain', 'sun', 'wind', 'storm', 'thunder'})
+        self.word_cloud.refresh_from_db()
+        self.assertIsNotNone(self.word_cloud.layout)
+        self.assertEqual(self.client.get(self.layout_url).data, response.data)
+
+    def test_layout_without_words(self):
+        """Test that a saved word cloud without words gets a 400 instead of a server error"""
+        empty = WordCloud.objects.create(user=self.user, title='Empty', input_text='')
+        response = self.client.get(reverse('wordcloud-layout', args=[empty.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+    def test_layout_not_found(self):
+        """Test that other users' word clouds are not exposed"""
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpassword')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.layout_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RasterTransportTest(TestCase):
+    def setUp(self):
+        self.data = {
+            'title': 'Weather',
+            'input_text': 'clouds rain sun wind storm clouds rain clouds thunder',
+            'width': 300,
+            'height': 200,
+            'font': 'arial',
+            'color_scheme': 'Greens',
+            'background_color': 'white',
+            'max_words': 50,
+            'word_density': 50,
+            'orientation': 'random',
+            'language': 'en',
+            'lemmatize': False,
+            'seed': 3,
+            'mask_shape': 'none',
+            'contour_width': 0,
+            'contour_color': 'black'
+        }
+
+    def test_ring_shares_raster_memory(self):
+        """Test that images read from a slot share its memory and slots are reused"""
+        ring = raster_transport.RasterRing(slots=2, slot_size=4096)
+        self.addCleanup(ring.close)
+
+        slot = ring.acquire()
+        handle = raster_transport.write_raster(ring.shm, slot, ring.slot_size, Image.new('RGB', (8, 4), 'red'))
+        self.assertEqual((handle.mode, handle.size, handle.nbytes), ('RGBA', (8, 4), 128))
+
+        image = ring.image(handle)
+        self.assertEqual(image.getpixel((0, 0)), (255, 0, 0, 255))
+        ring.view(slot, 4)[:] = bytes([0, 0, 255, 255])
+        self.assertEqual(image.getpixel((0, 0)), (0, 0, 255, 255))
+        image.close()
+
+        with self.assertRaises(raster_transport.RasterTooLarge):
+            raster_transport.write_raster(ring.shm, slot, ring.slot_size, Image.new('RGBA', (64, 64)))
+
+        other = ring.acquire()
+        with self.assertRaises(TimeoutError):
+            ring.acquire(timeout=0.01)
+        ring.release(slot)
+        ring.release(other)
+        self.assertEqual(ring.acquire(timeout=0.01), slot)
+        ring.release(slot)
+
+    def test_worker_render_matches_in_process(self):
+        """Test that a render worker returns the same image and layout as rendering in-process"""
+        pool = raster_transport.RenderPool(workers=1, slots=1, slot_size=16 * 1024 * 1024)
+        self.addCleanup(pool.shutdown)
+
+        expected_image, expected_layout = render_generated(self.data)
+        with pool.render(self.data) as (image, layout):
+            self.assertEqual(image.tobytes(), expected_image.convert('RGBA').tobytes())
+            self.assertEqual(layout, expected_layout)
+        self.assertEqual(pool.ring.acquire(timeout=0.01), 0)
+        pool.ring.release(0)
+
+        # Canvases that cannot fit a slot are refused before any work is sent to a worker
+        with patch.object(pool.executor, 'submit') as mock_submit:
+            with self.assertRaises(raster_transport.RasterTooLarge):
+                with pool.render({**self.data, 'width': 2000, 'height': 2000}):
+                    pass
+        mock_submit.assert_not_called()
+
+    @override_settings(WORDCLOUD_RENDER_WORKERS=1)
+    def test_dead_worker_replaces_pool(self):
+        """Test that a pool whose worker died is replaced instead of failing every later render"""
+        self.addCleanup(raster_transport.shutdown_render_pool)
+        pool = raster_transport.get_render_pool()
+        with self.assertRaises(BrokenProcessPool):
+            pool.executor.submit(os._exit, 1).result()
+
+        with self.assertRaises(BrokenProcessPool):
+            with pool.render(self.data):
+                pass
+        new_pool = raster_transport.get_render_pool()
+        self.assertIsNot(new_pool, pool)
+        with new_pool.render(self.data) as (image, layout):
+            self.assertTrue(layout)
+
+
+@patch('wordcloud_core.views.save_pil_image_to_azure', return_value='https://example.com/wordcloud.png')
+class CreditReservationTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.generate_url = reverse('wordcloud-generate')
+        self.data = {
+            'title': 'AI Cloud',
+            'frequencies': {'sun': 5, 'rain': 3, 'wind': 2},
+            'is_ai_generated': True
+        }
+
+    def test_reserve_commit_and_refund(self, mock_upload):
+        """Test that reservations deduct once and refunds restore the balance"""
+        reservation = credits.reserve(self.user, 2)
+        self.assertEqual(credits.remaining(self.user), 1)
+        reservation.refund()
+        reservation.refund()
+        self.assertEqual(credits.remaining(self.user), 3)
+
+        with credits.reserve(self.user):
+            pass
+        self.assertEqual(credits.remaining(self.user), 2)
+
+        with self.assertRaises(RuntimeError):
+            with credits.reserve(self.user):
+                raise RuntimeError('render failed')
+        self.assertEqual(credits.remaining(self.user), 2)
+
+    def test_batch_reservation(self, mock_upload):
+        """Test that a batch reservation is all-or-nothing and refunds unused credits on commit"""
+        with self.assertRaises(credits.InsufficientCredits):
+            credits.reserve(self.user, 4)
+        self.assertEqual(credits.remaining(self.user), 3)
+
+        reservation = credits.reserve(self.user, 3)
+        self.assertEqual(credits.remaining(self.user), 0)
+        reservation.commit(used=1)
+        self.assertEqual(credits.remaining(self.user), 2)
+
+    def test_racing_reservations_for_last_credit(self, mock_upload):
+        """Test that a reservation retries when a concurrent one for the last credit made both back off"""
+        credits.reserve(self.user, 2).commit()
+        remaining = credits.remaining
+        checks = []
+
+        def racing_remaining(user):
+            """On the first check after reserving, another request has reserved the last credit too and then backs off"""
+            checks.append(1)
+            if len(checks) != 2:
+                return remaining(user)
+            other = uuid.uuid4()
+            credits._append(user, 'reserve', -1, other)
+            balance = remaining(user)
+            credits._append(user, 'reject', 1, other)
+            return balance
+
+        with patch('wordcloud_core.credits.remaining', side_effect=racing_remaining):
+            reservation = credits.reserve(self.user)
+        reservation.commit()
+        self.assertEqual(credits.remaining(self.user), 0)
+        self.assertEqual(CreditLedgerEntry.objects.filter(user=self.user, kind='reject').count(), 2)
+
+    def test_generate_spends_and_refunds_credits(self, mock_upload):
+        """Test that AI generation spends a credit, refunds it on failure and stops at zero"""
+        response = self.client.post(self.generate_url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(credits.remaining(self.user), 2)
+
+        mock_upload.side_effect = RuntimeError('storage unavailable')
+        response = self.client.post(self.generate_url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(credits.remaining(self.user), 2)
+
+        credits.reserve(self.user, 2).commit()
+        response = self.client.post(self.generate_url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+        self.assertEqual(credits.remaining(self.user), 0)
+
+
+class CreditLedgerTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.credits_url = reverse('user-credits')
+
+    def test_changes_are_appended(self):
+        """Test that reservations, commits and refunds are recorded as ledger entries"""
+        credits.reserve(self.user).commit()
+        credits.reserve(self.user).refund()
+        with self.assertRaises(credits.InsufficientCredits):
+            credits.reserve(self.user, 3)
+
+        credits.reserve(self.user, 2).commit(used=1)
+
+        entries = list(CreditLedgerEntry.objects.filter(user=self.user).order_by('id').values_list('kind', 'amount'))
+        self.assertEqual(entries, [
+            ('reserve', -1),
+            ('reserve', -1), ('refund', 1),
+            ('reserve', -2), ('commit', 1),
+        ])
+        self.assertEqual(credits.remaining(self.user), 1)
+        # The stored balance is untouched until compaction
+        self.assertEqual(UserCredit.objects.get(user=self.user).credits_remaining, 3)
+
+    def test_reserve_outside_transactions_only(self):
+        """Test that reserving inside a transaction fails without touching the ledger"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                credits.reserve(self.user)
+        self.assertFalse(CreditLedgerEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(credits.remaining(self.user), 3)
+
+    def test_compaction_keeps_balance(self):
+        """Test that compaction folds entries into the stored balance and advances the watermark"""
+        credits.reserve(self.user).commit()
+        credits.grant(self.user, 5)
+
+        self.assertEqual(credits.compact(grace=60), 0)
+        self.assertEqual(credits.compact(grace=0), 1)
+        credit = UserCredit.objects.get(user=self.user)
+        self.assertEqual(credit.credits_remaining, 7)
+        self.assertEqual(credit.ledger_watermark, CreditLedgerEntry.objects.latest('id').id)
+        self.assertEqual(credits.compact(grace=0), 0)
+
+        credits.reserve(self.user, 2).commit(used=1)
+        self.assertEqual(credits.remaining(self.user), 6)
+        response = self.client.get(self.credits_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['credits_remaining'], 6)
+
+
+class WordCloudListTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Create a word cloud with a long text
+        self.word_cloud = WordCloud.objects.create(
+            user=self.user,
+            title='Long Text',
+            input_text='lorem ipsum ' * 10000,
+            layout=[['lorem', 1.0, 40, 0, 0, None, '#000000']]
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.list_create_url = reverse('wordcloud-list')
+
+    def test_list_returns_preview(self):
+        """Test that the list returns a truncated preview instead of the full text"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_create_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data['results'][0]
+        self.assertNotIn('input_text', item)
+        self.assertEqual(item['input_preview'], self.word_cloud.input_text[:INPUT_PREVIEW_LENGTH])
+        self.assertEqual(item['title'], 'Long Text')
+        # Heavy columns are not loaded
+        self.assertFalse(any('"layout"' in query['sql'] for query in queries.captured_queries))
+
+    def test_sparse_fieldset(self):
+        """Test that ?fields= limits the returned fields"""
+        response = self.client.get(self.list_create_url, {'fields': 'id,title,unknown'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.word_cloud.id, 'title': 'Long Text'}])
+
+    def test_cursor_pagination(self):
+        """Test that cursor pages walk every cloud once, newest first"""
+        for i in range(24):
+            WordCloud.objects.create(user=self.user, title=f'Cloud {i}', input_text='text')
+        expected = list(WordCloud.objects.filter(user=self.user).values_list('id', flat=True))
+
+        ids = []
+        url = self.list_create_url + '?fields=id&page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+
+
+class WordCloudSearchTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword'
+        )
+
+        # Create word clouds to search
+        self.ocean = WordCloud.objects.create(user=self.user, title='Ocean trip', input_text='waves sand sun')
+        self.notes = WordCloud.objects.create(user=self.user, title='Notes', input_text='the ocean was calm')
+        self.garden = WordCloud.objects.create(user=self.user, title='Garden', input_text='roses tulips soil')
+        WordCloud.objects.create(user=self.other_user, title='Ocean', input_text='ocean ocean')
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.search_url = reverse('wordcloud-search')
+
+    def test_ranked_results(self):
+        """Test that only the user's matching clouds are returned, title matches first"""
+        response = self.client.get(self.search_url, {'q': 'ocean'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.ocean.id, self.notes.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_index_follows_saves_and_deletes(self):
+        """Test that edits and deletions are reflected in search results"""
+        self.garden.input_text = 'roses by the ocean'
+        self.garden.save()
+        self.notes.delete()
+
+        response = self.client.get(self.search_url, {'q': 'ocean', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': self.ocean.id}, {'id': self.garden.id}])
+
+        response = self.client.get(self.search_url, {'q': 'ocean', 'limit': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_query_required(self):
+        """Test that searching without a query is rejected and query syntax is ignored"""
+        response = self.client.get(self.search_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.search_url, {'q': 'roses" OR (NEAR'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_large_text_indexes_prefix(self):
+        """Test that a multi-megabyte text is saved and searchable by the start of its text"""
+        text = 'lighthouse ' + ' '.join(f'word{i}' for i in range(300000))
+        large = WordCloud.objects.create(user=self.user, title='Large', input_text=text)
+
+        response = self.client.get(self.search_url, {'q': 'lighthouse', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': large.id}])
+        response = self.client.get(self.search_url, {'q': 'word299999', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+    def test_postgres_search_vector(self):
+        """Test the tsvector ranking and a vector PostgreSQL refuses falling back to the title"""
+        response = self.client.get(self.search_url, {'q': '"ocean was calm"', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': self.notes.id}])
+
+        with patch('wordcloud_core.search.SEARCH_TEXT_LIMIT', 10 ** 7):
+            text = ' '.join(f'lexeme{i}' for i in range(200000))
+            huge = WordCloud.objects.create(user=self.user, title='Huge ocean', input_text=text)
+        response = self.client.get(self.search_url, {'q': 'huge', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': huge.id}])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Create a test word cloud
+        self.word_cloud = WordCloud.objects.create(user=self.user, title='Polled', input_text='poll poll')
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URLs
+        self.list_create_url = reverse('wordcloud-list')
+        self.detail_url = reverse('wordcloud-detail', args=[self.word_cloud.id])
+        self.credits_url = reverse('user-credits')
+
+    def assertRevalidates(self, url, change):
+        """Fetch ``url``, expect 304 for its ETag, then 200 with a new ETag after ``change``"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_not_modified(self):
+        """Test that an unchanged cloud is answered with 304 without loading it"""
+        response = self.client.get(self.detail_url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        def rename():
+            self.word_cloud.title = 'Renamed'
+            self.word_cloud.save()
+        self.assertRevalidates(self.detail_url, rename)
+
+    def test_list_not_modified(self):
+        """Test that the list revalidates until a cloud is deleted"""
+        WordCloud.objects.create(user=self.user, title='Second', input_text='text')
+        self.assertRevalidates(self.list_create_url, self.word_cloud.delete)
+
+    def test_credits_not_modified(self):
+        """Test that credits revalidate until the balance changes"""
+        self.assertRevalidates(self.credits_url, lambda: credits.reserve(self.user).commit())
+
+
+class UserCacheTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # URL
+        self.credits_url = reverse('user-credits')
+
+    def test_process_local_cache_warning(self):
+        """Test that deploy checks warn about a user data cache other workers cannot see"""
+        self.assertEqual([warning.id for warning in checks.check_user_cache_shared(None)], ['wordcloud_core.W001'])
+        shared = {**settings.CACHES, 'user_data': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+        }}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_user_cache_shared(None), [])
+
+    def test_credits_served_from_cache(self):
+        """Test that repeated credit reads do not query the database"""
+        self.client.get(self.credits_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.credits_url)
+        self.assertEqual(response.data['credits_remaining'], 3)
+
+    def test_credit_changes_invalidate(self):
+        """Test that ledger writes and UserCredit saves invalidate the cached balance"""
+        self.assertEqual(user_cache.get_credits(self.user.pk)['balance'], 3)
+        credits.reserve(self.user).commit()
+        self.assertEqual(user_cache.get_credits(self.user.pk)['balance'], 2)
+
+        user_credit = UserCredit.objects.get(user=self.user)
+        user_credit.credits_remaining = 10
+        user_credit.save()
+        self.assertEqual(self.client.get(self.credits_url).data['credits_remaining'], 9)
+
+    def test_profile_invalidation(self):
+        """Test that profile saves and MFA flag updates invalidate the cached profile"""
+        self.assertFalse(user_cache.get_profile(self.user.pk).mfa_enabled)
+        user_cache.set_mfa_enabled(self.user.pk, True)
+        self.assertTrue(user_cache.get_profile(self.user.pk).mfa_enabled)
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.mfa_enabled = False
+        profile.save()
+        self.assertFalse(user_cache.get_profile(self.user.pk).mfa_enabled)
+
+
+class BulkOnboardingTest(TestCase):
+    def setUp(self):
+        # Create an admin user
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+        # URL
+        self.onboard_url = reverse('users-onboard')
+
+    def test_bulk_inserts_per_batch(self):
+        """Test that each batch costs a fixed number of queries, not three per user"""
+        users = [{'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(50)]
+        # Savepoint and release, then per batch: the existing-username lookup and one INSERT per table
+        with self.assertNumQueries(2 + 2 * 4):
+            result = onboarding.onboard_users(users, batch_size=25, credits=10)
+        self.assertEqual((result.created, result.skipped, result.rows), (50, 0, 150))
+
+        user = User.objects.get(username='user7')
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.credits.credits_remaining, 10)
+        self.assertFalse(user.profile.mfa_enabled)
+
+    def test_duplicates_skipped(self):
+        """Test that existing and repeated usernames are skipped"""
+        result = onboarding.onboard_users([
+            {'username': 'admin'},
+            {'username': 'new', 'password': 'secretpass123'},
+            {'username': 'new'},
+        ])
+        self.assertEqual((result.created, result.skipped), (1, 2))
+        self.assertTrue(User.objects.get(username='new').check_password('secretpass123'))
+        self.assertEqual(UserCredit.objects.get(user__username='new').credits_remaining, 3)
+
+    def test_onboard_endpoint(self):
+        """Test bulk onboarding through the admin endpoint and command"""
+        response = self.client.post(self.onboard_url, {
+            'users': [{'username': 'alice', 'email': 'alice@example.com'}, {'username': 'bob'}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(UserProfile.objects.filter(user__username__in=['alice', 'bob']).count(), 2)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email\ncarol,carol@example.com\n')
+        self.addCleanup(os.unlink, f.name)
+        out = io.StringIO()
+        call_command('onboard_users', f.name, stdout=out)
+        self.assertIn('Created 1 users', out.getvalue())
+        self.assertTrue(UserCredit.objects.filter(user__username='carol').exists())
+
+        self.client.force_authenticate(user=User.objects.get(username='alice'))
+        response = self.client.post(self.onboard_url, {'users': [{'username': 'mallory'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_validates_rows(self):
+        """Test that the command applies the endpoint's username and password hash checks"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email,password,password_hash\n'
+                    'dave,,secretpass123,\n'
+                    'erin,,,not-a-hash\n')
+        self.addCleanup(os.unlink, f.name)
+        with self.assertRaisesMessage(CommandError, 'Line 3'):
+            call_command('onboard_users', f.name, stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username__in=['dave', 'erin']).exists())
+
+        with open(f.name, 'w') as csv_file:
+            csv_file.write('username,password\ndave,secretpass123\nbad name!,x\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3'):
+            call_command('onboard_users', f.name, stdout=io.StringIO())
+
+        with open(f.name, 'w') as csv_file:
+            csv_file.write('username,password\ndave,secretpass123\n')
+        call_command('onboard_users', f.name, stdout=io.StringIO())
+        self.assertTrue(User.objects.get(username='dave').check_password('secretpass123'))
+
+    def test_concurrent_duplicate_conflict(self):
+        """Test that a username created between the duplicate check and the insert returns 409"""
+        with patch('wordcloud_core.onboarding.User.objects.bulk_create', side_effect=IntegrityError('duplicate')):
+            response = self.client.post(self.onboard_url, {'users': [{'username': 'alice'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_endpoint_passwords_and_size(self):
+        """Test that the endpoint takes only hashed passwords and caps the users per request"""
+        response = self.client.post(self.onboard_url, {
+            'users': [{'username': 'alice', 'password': 'secretpass123'}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.onboard_url, {
+            'users': [{'username': 'alice', 'password_hash': 'secretpass123'}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.onboard_url, {
+            'users': [{'username': 'alice', 'password_hash': make_password('secretpass123')}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='alice').check_password('secretpass123'))
+
+        response = self.client.post(self.onboard_url, {'users': [{'username': 'eve smith'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        users = [{'username': f'user{i}'} for i in range(settings.WORDCLOUD_ONBOARD_MAX_USERS + 1)]
+        response = self.client.post(self.onboard_url, {'users': users}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(username='user0').exists())
+
+
+@override_settings(WORDCLOUD_TEXT_BLOB_THRESHOLD=1000)
+class TextBlobStorageTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.long_text = 'storm clouds gather over the sea ' * 500
+
+    def test_large_text_is_compressed_and_shared(self):
+        """Test that large texts are stored once, compressed, and read back transparently"""
+        first = WordCloud.objects.create(user=self.user, title='First', input_text=self.long_text)
+        second = WordCloud.objects.create(user=self.user, title='Second', input_text=self.long_text)
+
+        self.assertEqual(TextBlob.objects.count(), 1)
+        blob = TextBlob.objects.get()
+        self.assertEqual(blob.size, len(self.long_text))
+        self.assertLess(len(blob.data), blob.size // 10)
+        self.assertEqual(first.text_blob_id, second.text_blob_id)
+        self.assertEqual(first.inline_text, self.long_text[:WordCloud.INLINE_PREFIX_LENGTH])
+
+        cloud = WordCloud.objects.get(pk=first.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cloud.input_text, self.long_text)
+            self.assertEqual(cloud.input_text, self.long_text)
+
+        response = self.client.get(reverse('wordcloud-detail', args=[first.pk]))
+        self.assertEqual(response.data['input_text'], self.long_text)
+
+    def test_small_text_stays_inline(self):
+        """Test that short texts stay in the row and replacing a large text drops its blob"""
+        cloud = WordCloud.objects.create(user=self.user, title='Cloud', input_text=self.long_text)
+        cloud.input_text = 'short text'
+        cloud.save(update_fields=['input_text'])
+
+        cloud = WordCloud.objects.get(pk=cloud.pk)
+        self.assertIsNone(cloud.text_blob_id)
+        self.assertEqual(cloud.input_text, 'short text')
+
+        # Recently stored blobs survive, since a save may be about to reference them
+        call_command('purge_text_blobs', stdout=io.StringIO())
+        self.assertEqual(TextBlob.objects.count(), 1)
+        call_command('purge_text_blobs', grace=0, stdout=io.StringIO())
+        self.assertFalse(TextBlob.objects.exists())
+
+    def test_externalize_existing_texts(self):
+        """Test that texts stored inline before blobs existed are moved out of the row"""
+        cloud = WordCloud.objects.create(user=self.user, title='Cloud', input_text='short text')
+        updated_at = cloud.updated_at
+        # A row written before the text blob migration
+        WordCloud.objects.filter(pk=cloud.pk).update(inline_text=self.long_text)
+
+        call_command('externalize_input_texts', stdout=io.StringIO())
+        cloud = WordCloud.objects.get(pk=cloud.pk)
+        self.assertIsNotNone(cloud.text_blob_id)
+        self.assertEqual(cloud.inline_text, self.long_text[:WordCloud.INLINE_PREFIX_LENGTH])
+        self.assertEqual(cloud.input_text, self.long_text)
+        self.assertEqual(cloud.updated_at, updated_at)
+
+    def test_unrelated_updates_do_not_reindex(self):
+        """Test that saves that leave the title and text alone do not store or reindex the text"""
+        cloud = WordCloud.objects.create(user=self.user, title='Cloud', input_text=self.long_text)
+        detail_url = reverse('wordcloud-detail', args=[cloud.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(detail_url, {'seed': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The response still reads the text; the save neither stores nor reindexes it
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'UPDATE "wordcloud_core_textblob"'))
+                             or '_fts' in query['sql'] for query in queries.captured_queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(detail_url, {'title': 'Renamed'}, format='json')
+        self.assertTrue(any('_fts' in query['sql'] for query in queries.captured_queries))
+        response = self.client.get(reverse('wordcloud-search'), {'q': 'renamed', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': cloud.pk}])
+
+    def test_text_or_frequencies_required(self):
+        """Test that a cloud cannot be created or left without text and frequencies"""
+        response = self.client.post(reverse('wordcloud-list'), {'title': 'Empty'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        cloud = WordCloud.objects.create(user=self.user, title='Cloud', input_text=self.long_text)
+        detail_url = reverse('wordcloud-detail', args=[cloud.pk])
+        response = self.client.patch(detail_url, {'input_text': '', 'frequencies': None}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(detail_url, {'input_text': '', 'frequencies': {'sun': 2}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(detail_url, {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_does_not_load_text(self):
+        """Test that listing clouds previews externalized texts without loading them"""
+        WordCloud.objects.create(user=self.user, title='Cloud', input_text=self.long_text)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('wordcloud-list'))
+        self.assertEqual(response.data['results'][0]['input_preview'], self.long_text[:INPUT_PREVIEW_LENGTH])
+        self.assertFalse(any('textblob' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(list(WordCloud.objects.iter_input_texts()), [self.long_text])
+
+
+@override_settings(WORDCLOUD_READ_REPLICAS=['replica1'])
+class ReadReplicaRoutingTest(TestCase):
+    def setUp(self):
+        # Create a test user
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword'
+        )
+        self.wordcloud = WordCloud.objects.create(user=self.user, title='Cloud', input_text='replica lag')
+        # Drop pins and cached credits left by other tests
+        caches[settings.WORDCLOUD_USER_CACHE_ALIAS].clear()
+
+        # Set up the API client
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def record_replica_reads(self):
+        """Patch the router to record whether each read would go to a replica, then use the primary"""
+        reads = []
+
+        def db_for_read(router, model, **hints):
+            reads.append(db_router.replica_reads.get())
+            return None
+        patcher = patch.object(db_router.ReadReplicaRouter, 'db_for_read', db_for_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return reads
+
+    def test_router(self):
+        """Test that only reads inside replica views use a replica, and writes never do"""
+        router = db_router.ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(WordCloud))
+        token = db_router.replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(WordCloud), 'replica1')
+            self.assertEqual(router.db_for_write(WordCloud, instance=self.wordcloud), 'default')
+        finally:
+            db_router.replica_reads.reset(token)
+        self.assertFalse(router.allow_migrate('replica1', 'wordcloud_core'))
+        self.assertIsNone(router.allow_migrate('default', 'wordcloud_core'))
+
+    def test_safe_reads_use_replica(self):
+        """Test that list and detail GETs read from a replica"""
+        reads = self.record_replica_reads()
+        for url in (reverse('wordcloud-list'), reverse('wordcloud-detail', args=[self.wordcloud.pk])):
+            reads.clear()
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.assertTrue(reads and all(reads))
+        self.assertFalse(db_router.replica_reads.get())
+
+    def test_reads_after_write_use_primary(self):
+        """Test that a user's reads go to the primary right after their own write"""
+        response = self.client.patch(
+            reverse('wordcloud-detail', args=[self.wordcloud.pk]), {'title': 'Renamed'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(db_router.is_pinned_to_primary(self.user.pk))
+
+        reads = self.record_replica_reads()
+        response = self.client.get(reverse('wordcloud-detail', args=[self.wordcloud.pk]))
+        self.assertEqual(response.data['title'], 'Renamed')
+        self.assertFalse(any(reads))
+
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.assertFalse(db_router.is_pinned_to_primary(other.pk))
+
+    def test_replicas_need_shared_pin_cache(self):
+        """Test that replicas with a process-local pin cache fail the system checks"""
+        self.assertEqual([error.id for error in checks.check_replica_pin_cache(None)], ['wordcloud_core.E001'])
+        shared = {**settings.CACHES, 'user_data': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+        }}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+        with override_settings(WORDCLOUD_READ_REPLICAS=[]):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+
+    def test_cached_credits_load_from_primary(self):
+        """Test that credit balances are cached from the primary, never from a lagging replica"""
+        credits.grant(self.user, 5)
+        # A replica that has not seen the grant; any read routed to it would fail
+        with patch.object(db_router.ReadReplicaRouter, 'db_for_read', return_value='lagging'):
+            response = self.client.get(reverse('user-credits'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['credits_remaining'], 8)
+        self.assertEqual(user_cache.get_credits(self.user.pk)['balance'], 8)
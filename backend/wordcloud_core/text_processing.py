@@ -0,0 +1,431 @@
+"""
+Text processing for word clouds.
+
+``count_text`` reproduces ``WordCloud.process_text`` (collocations included)
+from per-chunk counts, so large inputs can be counted in a process pool with
+results identical to the sequential path. Token regexes are compiled once,
+stopword sets are frozen per language and loaded once per process, and the
+optional lemmatizer is memoized per token.
+
+The streaming path never holds the input in memory as a whole: text is
+decoded chunk by chunk, tokenized with the same rules (without collocations)
+and counted incrementally in bounded memory. Only the resulting top-N
+frequency table is passed on to the renderer via ``generate_from_frequencies``.
+
+For corpora whose vocabulary is too large for an exact ``Counter``,
+``SpaceSaving`` keeps a fixed number of counters and reports the heavy
+hitters with a guaranteed error bound.
+"""
+import codecs
+import heapq
+import math
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+
+from django.conf import settings
+from wordcloud import STOPWORDS
+from wordcloud.tokenization import score
+
+
+# Same token pattern the wordcloud package uses by default
+TOKEN_RE = re.compile(r"\w[\w']*")
+WHITESPACE_RE = re.compile(r"\s")
+
+# Bundled stopword lists for languages other than English (<language>.txt)
+STOPWORDS_DIR = os.path.join(os.path.dirname(__file__), 'stopwords')
+
+# Plural-to-singular rules used by lemmatize(), first match wins
+LEMMA_RULES = {
+    'en': [
+        (re.compile(r"ies$", re.IGNORECASE), 'y'),
+        (re.compile(r"(ss|sh|ch|x)es$", re.IGNORECASE), r'\1'),
+        (re.compile(r"(?<![siu])s$", re.IGNORECASE), ''),
+    ],
+    'es': [(re.compile(r"(?<=[aeiouáéó])s$", re.IGNORECASE), '')],
+    'pt': [(re.compile(r"(?<=[aeiouáéó])s$", re.IGNORECASE), '')],
+    'fr': [
+        (re.compile(r"aux$", re.IGNORECASE), 'al'),
+        (re.compile(r"(?<=[aeiouéè])s$", re.IGNORECASE), ''),
+    ],
+}
+
+# Words the plural rules would damage, kept as they are
+LEMMA_EXCEPTIONS = {
+    'en': frozenset({
+        'series', 'species', 'news', 'always', 'perhaps', 'sometimes', 'towards', 'afterwards',
+        'besides', 'whereas', 'physics', 'mathematics', 'economics', 'politics', 'ethics',
+        'statistics', 'electronics', 'athletics', 'gymnastics', 'diabetes', 'means', 'headquarters',
+        'lens', 'gas', 'atlas', 'canvas', 'alias', 'bias', 'chaos', 'kudos', 'pathos', 'cosmos',
+        'ethos', 'thermos', 'christmas', 'texas', 'kansas', 'arkansas',
+    }),
+    'es': frozenset({
+        'crisis', 'análisis', 'tesis', 'síntesis', 'dosis', 'virus', 'lunes', 'martes',
+        'miércoles', 'jueves', 'viernes', 'atlas', 'caos',
+    }),
+    'pt': frozenset({'crise', 'análise', 'tese', 'vírus', 'lápis', 'atlas', 'caos'}),
+    'fr': frozenset({'temps', 'corps', 'pays', 'fois', 'mois', 'bras', 'virus', 'atlas', 'chaos'}),
+}
+
+# Characters decoded and tokenized per step
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+def iter_text_chunks(source, chunk_size=STREAM_CHUNK_SIZE, encoding='utf-8'):
+    """
+    Yield decoded text chunks from a string, a Django ``UploadedFile`` or a
+    binary file object. Multi-byte characters split across chunks are handled
+    by an incremental decoder; undecodable bytes are replaced.
+    """
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+        return
+
+    if hasattr(source, 'chunks'):
+        raw_chunks = source.chunks(chunk_size)
+    else:
+        raw_chunks = iter(lambda: source.read(chunk_size), b'')
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for raw in raw_chunks:
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_token_batches(chunks):
+    """
+    Yield one list of raw tokens per chunk. A token touching the end of a
+    chunk is carried over, since it may continue in the next one.
+    """
+    carry = ''
+    for chunk in chunks:
+        text = carry + chunk
+        carry = ''
+        tokens = TOKEN_RE.findall(text)
+        if tokens and text.endswith(tokens[-1]):
+            carry = tokens.pop()
+        yield tokens
+    if carry:
+        yield [carry]
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language='en'):
+    """Frozen, lower-case stopword set for ``language``, loaded once per process."""
+    if language == 'en':
+        return frozenset(word.lower() for word in STOPWORDS)
+    with open(os.path.join(STOPWORDS_DIR, f'{language}.txt'), encoding='utf-8') as f:
+        return frozenset(line.strip().lower() for line in f if line.strip())
+
+
+@lru_cache(maxsize=100000)
+def lemmatize(word, language='en'):
+    """
+    Light rule-based normalization of ``word``: Unicode NFC plus reducing
+    regular plurals to the singular. Memoized per (word, language), so each
+    distinct token is only normalized once per process.
+    """
+    word = unicodedata.normalize('NFC', word)
+    if len(word) < 4 or word.lower() in LEMMA_EXCEPTIONS.get(language, ()):
+        return word
+    for pattern, replacement in LEMMA_RULES.get(language, ()):
+        lemma, matched = pattern.subn(replacement, word, count=1)
+        if matched:
+            return lemma
+    return word
+
+
+def clean_tokens(tokens, language='en', lemmatize_words=False):
+    """
+    Strip possessive 's and drop numbers, like WordCloud.process_text.
+    Stopwords are never lemmatized, so the stopword check still matches them.
+    """
+    stopwords = get_stopwords(language) if lemmatize_words else ()
+    words = []
+    for word in tokens:
+        if word.lower().endswith("'s"):
+            word = word[:-2]
+        if not word or word.isdigit():
+            continue
+        if lemmatize_words and word.lower() not in stopwords:
+            word = lemmatize(word, language)
+        words.append(word)
+    return words
+
+
+def filter_words(tokens, language='en', lemmatize_words=False):
+    """Clean ``tokens`` and drop stopwords, whether or not their lemma is one."""
+    stopwords = get_stopwords(language)
+    return [word for word in clean_tokens(tokens, language, lemmatize_words) if word.lower() not in stopwords]
+
+
+def count_words(token_batches, language='en', lemmatize_words=False, max_distinct=None):
+    """
+    Count words from batches of tokens in bounded memory.
+
+    Counts are exact until more than ``max_distinct`` distinct words
+    (WORDCLOUD_STREAM_MAX_DISTINCT_WORDS by default) have been seen. Counting
+    then continues in a ``SpaceSaving`` summary of that many counters, whose
+    estimates over-count by at most ``words seen / max_distinct``.
+    """
+    max_distinct = max_distinct or settings.WORDCLOUD_STREAM_MAX_DISTINCT_WORDS
+    counts = Counter()
+    summary = None
+    for tokens in token_batches:
+        words = filter_words(tokens, language, lemmatize_words)
+        if summary is not None:
+            summary.update(Counter(words))
+            continue
+        counts.update(words)
+        if len(counts) > max_distinct:
+            summary = SpaceSaving(max_distinct)
+            summary.update(counts)
+    return Counter(summary.counts) if summary is not None else counts
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k counter (Metwally et al.) with fixed memory.
+
+    At most ``capacity`` words are monitored. Each estimate is an upper bound
+    of the true count and over-counts by at most ``total / capacity``, so with
+    ``capacity = ceil(1 / error_bound)`` the error is within ``error_bound``
+    of the number of words seen, whatever the vocabulary size.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+    @classmethod
+    def for_error_bound(cls, error_bound, max_words=0):
+        """Size the summary for a relative error bound, keeping room for ``max_words``."""
+        return cls(max(math.ceil(1 / error_bound), 2 * max_words))
+
+    def update(self, batch):
+        """Add a mapping of word -> count (e.g. one chunk's Counter)."""
+        pending = []
+        for word, count in batch.items():
+            self.total += count
+            if word in self.counts:
+                self.counts[word] += count
+            elif len(self.counts) < self.capacity:
+                self.counts[word] = count
+                self.errors[word] = 0
+            else:
+                pending.append((word, count))
+
+        if pending:
+            # Each unmonitored word replaces the current minimum and inherits
+            # its count as the over-estimation error
+            heap = [(count, word) for word, count in self.counts.items()]
+            heapq.heapify(heap)
+            for word, count in pending:
+                minimum, victim = heapq.heappop(heap)
+                del self.counts[victim]
+                del self.errors[victim]
+                self.counts[word] = minimum + count
+                self.errors[word] = minimum
+                heapq.heappush(heap, (minimum + count, word))
+
+    @property
+    def max_error(self):
+        """Largest possible over-count of any estimate."""
+        return self.total / self.capacity
+
+    def most_common(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+
+def count_words_approximate(token_batches, error_bound, max_words, language='en', lemmatize_words=False):
+    """Count words from batches of tokens with a fixed-size Space-Saving summary."""
+    summary = SpaceSaving.for_error_bound(error_bound, max_words)
+    for tokens in token_batches:
+        summary.update(Counter(filter_words(tokens, language, lemmatize_words)))
+    return summary
+
+
+def fold_counts_with_forms(counts, normalize_plurals=True):
+    """
+    Merge case variants and simple plurals in a word -> count mapping, like
+    ``wordcloud.tokenization.process_tokens`` does for a word list: each word is
+    shown in its most common case and "cats" is merged into "cat".
+
+    Returns ``(folded_counts, standard_forms)`` where ``standard_forms`` maps
+    every lower-case word (plurals included) to the form it was folded into.
+    Insertion order follows first appearance, so ties break the same way.
+    """
+    cases = defaultdict(dict)
+    for word, count in counts.items():
+        case_dict = cases[word.lower()]
+        case_dict[word] = case_dict.get(word, 0) + count
+
+    merged_plurals = {}
+    if normalize_plurals:
+        for key in list(cases.keys()):
+            if key.endswith('s') and not key.endswith('ss') and key[:-1] in cases:
+                singular = cases[key[:-1]]
+                for word, count in cases.pop(key).items():
+                    singular[word[:-1]] = singular.get(word[:-1], 0) + count
+                merged_plurals[key] = key[:-1]
+
+    folded = {}
+    standard_forms = {}
+    for word_lower, case_dict in cases.items():
+        first = max(case_dict.items(), key=lambda item: item[1])[0]
+        folded[first] = sum(case_dict.values())
+        standard_forms[word_lower] = first
+    for plural, singular in merged_plurals.items():
+        standard_forms[plural] = standard_forms[singular]
+    return folded, standard_forms
+
+
+def fold_counts(counts, normalize_plurals=True):
+    """Fold case variants and plurals in ``counts`` (see fold_counts_with_forms)."""
+    return fold_counts_with_forms(counts, normalize_plurals)[0]
+
+
+def count_chunk(text, language='en', lemmatize_words=False):
+    """
+    Map step: count one chunk of text.
+
+    Returns ``(unigrams, bigrams, first_word, last_word)``. Bigrams are counted
+    as "word1 word2" strings and skip pairs containing a stopword; the edge
+    words let the reduce step add the bigram spanning two chunks.
+    """
+    stopwords = get_stopwords(language)
+    words = clean_tokens(TOKEN_RE.findall(text), language, lemmatize_words)
+    unigrams = Counter(word for word in words if word.lower() not in stopwords)
+    bigrams = Counter(
+        f"{first} {second}" for first, second in zip(words, words[1:])
+        if first.lower() not in stopwords and second.lower() not in stopwords
+    )
+    return unigrams, bigrams, (words[0] if words else None), (words[-1] if words else None)
+
+
+def merge_chunk_counts(results, language='en'):
+    """Reduce step: merge ``count_chunk`` results, given in text order."""
+    stopwords = get_stopwords(language)
+    unigrams, bigrams = Counter(), Counter()
+    previous = None
+    for chunk_unigrams, chunk_bigrams, first, last in results:
+        if (previous is not None and first is not None
+                and previous.lower() not in stopwords and first.lower() not in stopwords):
+            bigrams[f"{previous} {first}"] += 1
+        unigrams.update(chunk_unigrams)
+        bigrams.update(chunk_bigrams)
+        if last is not None:
+            previous = last
+    return unigrams, bigrams
+
+
+def collocation_counts(unigrams, bigrams, normalize_plurals=True, collocation_threshold=30):
+    """
+    Word counts with collocations, computed from unigram and bigram counts.
+
+    Mirrors ``wordcloud.tokenization.unigrams_and_bigrams`` step by step so the
+    result (order included) is identical to ``WordCloud.process_text``.
+    """
+    n_words = sum(unigrams.values())
+    counts_unigrams, standard_form = fold_counts_with_forms(unigrams, normalize_plurals)
+    counts_bigrams = fold_counts(bigrams, normalize_plurals)
+    orig_counts = counts_unigrams.copy()
+
+    for bigram_string, count in counts_bigrams.items():
+        bigram = tuple(bigram_string.split(" "))
+        word1 = standard_form[bigram[0].lower()]
+        word2 = standard_form[bigram[1].lower()]
+
+        if score(count, orig_counts[word1], orig_counts[word2], n_words) > collocation_threshold:
+            counts_unigrams[word1] -= count
+            counts_unigrams[word2] -= count
+            counts_unigrams[bigram_string] = count
+
+    return {word: count for word, count in counts_unigrams.items() if count > 0}
+
+
+def split_text(text, parts):
+    """Split ``text`` into about ``parts`` pieces at whitespace, so no token is cut."""
+    size = max(1, len(text) // parts)
+    pieces = []
+    start = 0
+    while len(pieces) < parts - 1:
+        match = WHITESPACE_RE.search(text, start + size)
+        if match is None:
+            break
+        pieces.append(text[start:match.start()])
+        start = match.start()
+    pieces.append(text[start:])
+    return pieces
+
+
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers):
+    """Return the shared counting pool, creating it on first use."""
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            # spawn rather than fork: request workers may be multi-threaded
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def count_text(text, language='en', lemmatize_words=False, workers=None, min_parallel_chars=None):
+    """
+    Return word counts for ``text`` exactly as ``WordCloud.process_text`` would.
+
+    Texts of at least ``min_parallel_chars`` characters are split at whitespace
+    and counted in a process pool (map), then merged in order (reduce); the
+    result is identical to counting sequentially.
+    """
+    workers = workers or settings.WORDCLOUD_COUNT_WORKERS
+    if min_parallel_chars is None:
+        min_parallel_chars = settings.WORDCLOUD_PARALLEL_MIN_CHARS
+
+    if workers > 1 and len(text) >= min_parallel_chars:
+        # A few pieces per worker keeps them busy when chunks finish unevenly
+        pieces = split_text(text, workers * 4)
+        results = get_process_pool(workers).map(count_chunk, pieces, repeat(language), repeat(lemmatize_words))
+    else:
+        results = [count_chunk(text, language, lemmatize_words)]
+
+    return collocation_counts(*merge_chunk_counts(results, language))
+
+
+def top_frequencies(counts, max_words):
+    """Return the ``max_words`` most frequent entries as a dict."""
+    return dict(Counter(counts).most_common(max_words))
+
+
+def stream_frequencies(source, max_words, language='en', lemmatize_words=False, chunk_size=STREAM_CHUNK_SIZE,
+                       max_distinct=None, error_bound=None):
+    """
+    Tokenize and count ``source`` chunk by chunk and return its top-N frequency
+    table. With ``error_bound`` set, counting uses a fixed-size Space-Saving
+    summary instead of an exact Counter.
+    """
+    batches = iter_token_batches(iter_text_chunks(source, chunk_size))
+    if error_bound:
+        counts = count_words_approximate(batches, error_bound, max_words, language, lemmatize_words).counts
+    else:
+        counts = count_words(batches, language, lemmatize_words, max_distinct)
+    return top_frequencies(fold_counts(counts), max_words)
@@ -3,19 +3,31 @@ from django.urls import path
 from .views import (
     WordCloudListCreateView,
     WordCloudDetailView,
+    WordCloudSearchView,
     GenerateWordCloudView,
+    StreamGenerateWordCloudView,
     AIWordSuggestionsView,
     UserCreditView,
-    WordCloudExportView
+    WordCloudExportView,
+    WordCloudLayoutPreviewView,
+    WordCloudLayoutView,
+    UpstreamMetricsView,
+    BulkOnboardView
 )
 
 urlpatterns = [
     path('wordclouds/', WordCloudListCreateView.as_view(), name='wordcloud-list'),
     path('wordclouds/<int:pk>/', WordCloudDetailView.as_view(), name='wordcloud-detail'),
+    path('wordclouds/search/', WordCloudSearchView.as_view(), name='wordcloud-search'),
     path('wordclouds/generate/', GenerateWordCloudView.as_view(), name='wordcloud-generate'),
+    path('wordclouds/generate/stream/', StreamGenerateWordCloudView.as_view(), name='wordcloud-generate-stream'),
+    path('wordclouds/layout/', WordCloudLayoutPreviewView.as_view(), name='wordcloud-layout-preview'),
+    path('wordclouds/<int:pk>/layout/', WordCloudLayoutView.as_view(), name='wordcloud-layout'),
     path('wordclouds/<int:pk>/export/', WordCloudExportView.as_view(), name='wordcloud-export'),
     path('ai/suggestions/', AIWordSuggestionsView.as_view(), name='ai-word-suggestions'),
+    path('ai/metrics/', UpstreamMetricsView.as_view(), name='ai-metrics'),
     path('user/credits/', UserCreditView.as_view(), name='user-credits'),
+    path('users/onboard/', BulkOnboardView.as_view(), name='users-onboard'),
     # path('admin/', admin.site.urls),
     # path('api/auth/', include('authentication.urls')), # Your API endpoint for auth
 ]
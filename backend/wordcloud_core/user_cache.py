@@ -0,0 +1,86 @@
+"""
+Per-user read cache for AI credit balances and profiles.
+
+Entries live in the cache named by ``settings.WORDCLOUD_USER_CACHE_ALIAS``.
+That defaults to the process-local memory cache, where invalidation only
+reaches the process that made the change: with several worker processes the
+others keep serving the old value, and ETags built from it, until the entry
+expires. Deployments with more than one process must point it at a shared
+backend (Redis, Memcached); ``manage.py check --deploy`` warns otherwise. Entries are deleted
+whenever the underlying rows change: from post_save/post_delete on
+UserCredit and UserProfile, from every credit ledger write in ``credits``,
+and from writes made with ``QuerySet.update()``. A read racing a write can
+put back the old value, so entries also expire after
+``settings.WORDCLOUD_USER_CACHE_TIMEOUT`` seconds. Entries are always loaded
+from the primary database, even in views that read from replicas, so a
+lagging replica cannot put an old value back for that long. Reservations
+never read from here; they always check the balance in the database.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import credits
+from .models import UserCredit, UserProfile
+
+CREDITS_KEY = 'wordcloud:credits:{}'
+PROFILE_KEY = 'wordcloud:profile:{}'
+
+
+def _cache():
+    return caches[settings.WORDCLOUD_USER_CACHE_ALIAS]
+
+
+def _get_or_load(key, load):
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        if value is not None:
+            cache.set(key, value, settings.WORDCLOUD_USER_CACHE_TIMEOUT)
+    return value
+
+
+def get_credits(user_id):
+    """``{'balance': ..., 'last_activity': ...}`` for a user, or None when they have no credit row."""
+    return _get_or_load(
+        CREDITS_KEY.format(user_id),
+        lambda: credits.with_balance(UserCredit.objects.using('default').filter(user_id=user_id)).values(
+            'balance', 'last_activity'
+        ).first()
+    )
+
+
+def get_profile(user_id):
+    """A user's UserProfile, or None when they have none."""
+    return _get_or_load(
+        PROFILE_KEY.format(user_id),
+        lambda: UserProfile.objects.using('default').filter(user_id=user_id).first()
+    )
+
+
+def invalidate_credits(user_id):
+    _cache().delete(CREDITS_KEY.format(user_id))
+
+
+def invalidate_profile(user_id):
+    _cache().delete(PROFILE_KEY.format(user_id))
+
+
+def set_mfa_enabled(user_id, enabled):
+    """Update a profile's MFA flag in one UPDATE, without loading the profile."""
+    UserProfile.objects.filter(user_id=user_id).update(mfa_enabled=enabled, updated_at=timezone.now())
+    invalidate_profile(user_id)
+
+
+# Connected when the app is ready (see apps.py)
+@receiver([post_save, post_delete], sender=UserCredit)
+def invalidate_cached_credits(sender, instance, **kwargs):
+    invalidate_credits(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
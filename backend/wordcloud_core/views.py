@@ -3,44 +3,98 @@ import io
 import json
 import logging
 import os
+import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import matplotlib
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from matplotlib import pyplot as plt
+from django.db import IntegrityError
+from django.db.models import Count, Max
+from django.db.models.functions import Substr
 
 from wordcloud_project.custom_azure import AzureMediaStorage
 
 
 logger = logging.getLogger(__name__)
 
-matplotlib.use('Agg')  # Use non-interactive backend
-from wordcloud import WordCloud as WC
-from PIL import Image
-from django.http import HttpResponse
+matplotlib.use('Agg')  # Use non-interactive backend (wordcloud imports pyplot for colormaps)
+from django.http import Http404, HttpResponse
 from rest_framework import generics, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 import openai
-from .models import WordCloud, UserCredit
+from . import credits, local_suggestions, onboarding, user_cache
+from .raster_transport import RasterTooLarge, get_render_pool
+from .rendering import (
+    apply_layout,
+    build_wordcloud,
+    compact_layout,
+    fit_wordcloud,
+    layout_to_json,
+    layout_wordcloud,
+    render_generated,
+    render_options,
+    render_wordcloud_image,
+)
+from .text_processing import stream_frequencies
+from .resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientCaller, all_metrics
+from .masks import encode_mask, get_mask, resize_mask
+from .models import WordCloud, generate_seed
+from .conditional import ConditionalGetMixin
+from .db_router import ReplicaReadMixin
+from .pagination import SearchPagination, WordCloudCursorPagination
+from .search import search_wordclouds
 from .serializers import (
     WordCloudSerializer,
     WordCloudGenerateSerializer,
+    WordCloudStreamGenerateSerializer,
     WordCloudExportSerializer,
     AIWordSuggestionsSerializer,
-    UserCreditSerializer
+    UserCreditSerializer,
+    BulkOnboardSerializer,
+    WordCloudListSerializer,
+    INPUT_PREVIEW_LENGTH
+)
+
+# Configure OpenAI API. The client timeout bounds each attempt and retries are
+# handled by openai_caller, so the SDK's own retry loop is disabled.
+client = openai.OpenAI(
+    api_key=os.environ.get("OPENAI_API_KEY"),
+    timeout=settings.OPENAI_TIMEOUT_SECONDS,
+    max_retries=0
 )
 
-# Configure OpenAI API
-client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Deadline, circuit breaker and hedged attempts for every OpenAI request
+openai_caller = ResilientCaller(
+    'openai',
+    deadline=settings.OPENAI_TIMEOUT_SECONDS,
+    breaker=CircuitBreaker(
+        failure_rate=settings.OPENAI_BREAKER_FAILURE_RATE,
+        minimum_calls=settings.OPENAI_BREAKER_MINIMUM_CALLS,
+        window_seconds=settings.OPENAI_BREAKER_WINDOW_SECONDS,
+        reset_seconds=settings.OPENAI_BREAKER_RESET_SECONDS
+    ),
+    hedge=settings.OPENAI_HEDGE_REQUESTS,
+    hedge_after=settings.OPENAI_HEDGE_AFTER_SECONDS
+)
 
 
 def run_prompt_gpt4mini(request, prompt, wordCount=100):
     if prompt == "" or prompt is None:
         return "Prompt is empty."
 
+    return openai_caller(_request_gpt4mini, prompt, wordCount)
+
+
+def _request_gpt4mini(prompt, wordCount):
+    """Single OpenAI attempt; run through openai_caller"""
     response = client.responses.create(
         model="gpt-4o-mini",
         # input=[{"role": "user", "content": f"Generate {wordCount} words for a word cloud using the foollowing theme or suggestion: {prompt}"}],
@@ -67,6 +121,68 @@ def run_prompt_gpt4mini(request, prompt, wordCount=100):
     return response.output_text
 
 
+# Shared pool used to race the upstream call against the local index
+suggestion_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ai-suggestions')
+
+
+def parse_word_suggestions(response_text):
+    """Extract a list of words from the raw model output"""
+    # Try to extract JSON array from the response
+    try:
+        # If the response is already a valid JSON array
+        words = json.loads(response_text)
+        if not isinstance(words, list):
+            raise ValueError("Response is not a list")
+    except json.JSONDecodeError:
+        # If the response contains text around the JSON, try to extract it
+        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+        if json_match:
+            try:
+                words = json.loads(json_match.group(0))
+            except json.JSONDecodeError:
+                # If still can't parse, fall back to splitting by comma or newline
+                words = [w.strip().strip('"\'[]') for w in response_text.replace('\n', ',').split(',')]
+        else:
+            # Fall back to splitting by comma or newline
+            words = [w.strip().strip('"\'[]') for w in response_text.replace('\n', ',').split(',')]
+
+    # Filter out any empty strings
+    return [word for word in words if word]
+
+
+def get_word_suggestions(request, topic, count):
+    """
+    Return ``(words, source)`` from the source set in AI_SUGGESTIONS_SOURCE.
+
+    'openai' and 'local' use a single source. 'fallback' waits up to
+    AI_SUGGESTIONS_LATENCY_BUDGET seconds for OpenAI and then answers from the
+    local index; without a local answer it keeps waiting for OpenAI.
+    """
+    mode = settings.AI_SUGGESTIONS_SOURCE
+
+    if mode == 'local':
+        words = local_suggestions.suggest_words(topic, count)
+        if words is None:
+            raise RuntimeError('Local suggestion index is not available or knows no words related to the topic')
+        return words, 'local'
+
+    if mode == 'openai':
+        return parse_word_suggestions(run_prompt_gpt4mini(request, topic, count)), 'openai'
+
+    upstream = suggestion_executor.submit(run_prompt_gpt4mini, request, topic, count)
+    try:
+        return parse_word_suggestions(upstream.result(timeout=settings.AI_SUGGESTIONS_LATENCY_BUDGET)), 'openai'
+    except Exception as e:
+        logger.warning("OpenAI suggestions unavailable for %r, trying local index: %r", topic, e)
+        words = local_suggestions.suggest_words(topic, count)
+        if words:
+            return words, 'local'
+        if isinstance(e, TimeoutError):
+            # No local answer either, so keep waiting for the upstream call
+            return parse_word_suggestions(upstream.result()), 'openai'
+        raise
+
+
 def get_file_path(folder: str = None, filename: str = None) -> str:
     """
     Generate a structured file path using an optional folder and filename.
@@ -99,66 +215,226 @@ def save_pil_image_to_azure(image, folder: str = None, filename: str = None) ->
     return fs.url(saved_path)
 
 
-class WordCloudListCreateView(generics.ListCreateAPIView):
+def restore_wordcloud(wordcloud, scale=None, background_color=None, color_scheme=None, contour_width=None,
+                      contour_color=None):
+    """
+    Rebuild the layout of a stored word cloud from its seed, reusing the saved
+    layout when there is one, so every re-render matches the original.
+    ``scale`` defaults to the stored word density.
+    """
+    wc_obj = build_wordcloud(
+        wordcloud.font,
+        wordcloud.width,
+        wordcloud.height,
+        background_color or wordcloud.background_color,
+        wordcloud.max_words,
+        wordcloud.orientation,
+        scale if scale is not None else wordcloud.word_density / 50,
+        color_scheme or wordcloud.color_scheme,
+        wordcloud.seed,
+        get_mask(wordcloud.mask_shape, wordcloud.width, wordcloud.height, wordcloud.mask_image),
+        contour_width if contour_width is not None else wordcloud.contour_width,
+        contour_color or wordcloud.contour_color
+    )
+    if wordcloud.layout:
+        return apply_layout(wc_obj, wordcloud.layout)
+    return fit_wordcloud(wc_obj, wordcloud.input_text, wordcloud.frequencies, wordcloud.language, wordcloud.lemmatize)
+
+
+def layout_response_data(layout, width, height, background_color, font, seed):
+    """Compact layout payload drawn client-side by the preview component"""
+    return {
+        'width': width,
+        'height': height,
+        'background_color': background_color,
+        'font': font,
+        'seed': seed,
+        'words': compact_layout(layout),
+    }
+
+
+class WordCloudListMixin:
+    """Compact list representation of word clouds with ?fields= sparse fieldsets"""
+
+    def list_queryset(self, queryset):
+        """Load only the listed columns of ``queryset``"""
+        fields = self.get_list_fields()
+        # The pagination cursor is built from updated_at
+        queryset = queryset.only('updated_at', *(field for field in fields if field != 'input_preview'))
+        if 'input_preview' in fields:
+            # Only the start of the text leaves the database (externalized texts keep a prefix inline)
+            queryset = queryset.annotate(input_preview=Substr('inline_text', 1, INPUT_PREVIEW_LENGTH))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return WordCloudListSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs['fields'] = self.get_list_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_list_fields(self):
+        """Fields requested with ?fields=a,b (unknown names are ignored), or all list fields"""
+        available = WordCloudListSerializer.Meta.fields
+        requested = set(self.request.query_params.get('fields', '').split(','))
+        fields = [field for field in available if field in requested]
+        return fields or available
+
+
+class WordCloudListCreateView(ReplicaReadMixin, ConditionalGetMixin, WordCloudListMixin, generics.ListCreateAPIView):
     """API view to list and create word clouds"""
     serializer_class = WordCloudSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WordCloudCursorPagination
+
+    def get_validators(self):
+        """Newest update and number of the user's clouds; deletions change the count"""
+        aggregate = WordCloud.objects.filter(user=self.request.user).aggregate(
+            last_modified=Max('updated_at'), count=Count('id')
+        )
+        return aggregate['last_modified'], aggregate['count']
 
     def get_queryset(self):
         """Return only word clouds belonging to the current user"""
-        return WordCloud.objects.filter(user=self.request.user)
+        queryset = WordCloud.objects.filter(user=self.request.user)
+        if self.request.method == 'GET':
+            return self.list_queryset(queryset)
+        return queryset
 
     def perform_create(self, serializer):
         """Set the user when creating a new word cloud"""
         serializer.save(user=self.request.user)
 
 
-class WordCloudDetailView(generics.RetrieveUpdateDestroyAPIView):
+class WordCloudSearchView(ReplicaReadMixin, WordCloudListMixin, generics.ListAPIView):
+    """API view to full-text search the current user's word clouds, best matches first"""
+    serializer_class = WordCloudListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        """Return the current user's word clouds matching ?q=, ranked by relevance"""
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'A search query is required.'})
+        return search_wordclouds(self.list_queryset(WordCloud.objects.filter(user=self.request.user)), query)
+
+
+class WordCloudDetailView(ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """API view to retrieve, update and delete word clouds"""
     serializer_class = WordCloudSerializer
     permission_classes = [IsAuthenticated]
 
+    # Fields that only change how the stored layout is painted
+    STYLE_FIELDS = {'color_scheme', 'background_color', 'contour_width', 'contour_color'}
+    # Fields that change where words are placed
+    LAYOUT_FIELDS = {
+        'input_text', 'frequencies', 'width', 'height', 'font', 'max_words',
+        'orientation', 'language', 'lemmatize', 'seed'
+    }
+
     def get_queryset(self):
         """Return only word clouds belonging to the current user"""
         return WordCloud.objects.filter(user=self.request.user)
 
+    def get_validators(self):
+        """The cloud's updated_at, without loading the row"""
+        updated_at = self.get_queryset().filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+        return (updated_at, None) if updated_at else None
+
+    def perform_update(self, serializer):
+        """Redraw the image from the stored layout when only style fields changed"""
+        wordcloud = serializer.instance
+        changed = {
+            field for field, value in serializer.validated_data.items()
+            if getattr(wordcloud, field) != value
+        }
+        if changed and changed <= self.STYLE_FIELDS and wordcloud.layout:
+            try:
+                restyled = self._restyle(wordcloud, serializer.validated_data, changed)
+            except Exception as e:
+                logger.exception("Restyling word cloud %s failed", wordcloud.pk)
+                raise APIException(f'Failed to restyle word cloud: {str(e)}')
+            # Write only the restyled columns, not the text and the rest of the row
+            for field in changed:
+                setattr(wordcloud, field, serializer.validated_data[field])
+            for field, value in restyled.items():
+                setattr(wordcloud, field, value)
+            wordcloud.save(update_fields=[*changed, *restyled, 'updated_at'])
+        elif changed & self.LAYOUT_FIELDS:
+            # The stored layout is stale; the next render lays the words out again
+            extra = {'layout': None}
+            if changed & {'width', 'height'} and wordcloud.mask_image:
+                # Custom masks are stored at the canvas size
+                extra['mask_image'] = resize_mask(
+                    wordcloud.mask_image,
+                    serializer.validated_data.get('width', wordcloud.width),
+                    serializer.validated_data.get('height', wordcloud.height)
+                )
+            serializer.save(**extra)
+        else:
+            serializer.save()
+
+    def _restyle(self, wordcloud, data, changed):
+        """Recolor the stored layout and upload the new raster, skipping the layout pass"""
+        wc_obj = restore_wordcloud(
+            wordcloud,
+            background_color=data.get('background_color'),
+            color_scheme=data.get('color_scheme'),
+            contour_width=data.get('contour_width'),
+            contour_color=data.get('contour_color')
+        )
+        if 'color_scheme' in changed:
+            wc_obj.recolor(random_state=wordcloud.seed)
+
+        image = render_wordcloud_image(wc_obj, wordcloud.title, wordcloud.width, wordcloud.height)
+        return {
+            'image_url': save_pil_image_to_azure(image, folder='wordclouds'),
+            'layout': layout_to_json(wc_obj.layout_),
+        }
+
 
 class GenerateWordCloudView(APIView):
     """API view to generate a word cloud"""
     permission_classes = [IsAuthenticated]
+    serializer_class = WordCloudGenerateSerializer
 
     def post(self, request):
-        serializer = WordCloudGenerateSerializer(data=request.data)
+        serializer = self.serializer_class(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        data = serializer.validated_data
+        data = self.prepare_data(serializer.validated_data)
+        if not data.get('input_text') and not data.get('frequencies'):
+            return Response(
+                {'error': 'No words found in the input.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Check if AI-generated and if user has enough credits
+        # Reserve a credit for AI-generated clouds before rendering
+        reservation = None
         if data['is_ai_generated']:
-            user_credit = UserCredit.objects.get(user=request.user)
-            if user_credit.credits_remaining <= 0:
+            try:
+                reservation = credits.reserve(request.user)
+            except credits.InsufficientCredits:
                 return Response(
                     {'error': 'You have no AI credits remaining. Please purchase more credits.'},
                     status=status.HTTP_402_PAYMENT_REQUIRED
                 )
 
-            # Deduct credit
-            user_credit.credits_remaining -= 1
-            user_credit.save()
-
         try:
-            # Generate word cloud image using matplotlib
-            wordcloud_img = self._generate_wordcloud_matplotlib(data)
-
-            # Upload to Azure Blob Storage (only image)
-            image_url = save_pil_image_to_azure(wordcloud_img, folder='wordclouds')
+            # Generate the word cloud image using matplotlib and upload it to Azure Blob Storage
+            image_url, layout = self._render_and_upload(self.prepare_layout(data))
 
             # Create and save WordCloud model
             wordcloud = WordCloud.objects.create(
                 user=request.user,
                 title=data['title'],
-                input_text=data['input_text'],
+                input_text=data.get('input_text', ''),
+                frequencies=data.get('frequencies'),
                 is_ai_generated=data['is_ai_generated'],
                 width=data['width'],
                 height=data['height'],
@@ -168,61 +444,65 @@ class GenerateWordCloudView(APIView):
                 max_words=data['max_words'],
                 word_density=data['word_density'],
                 orientation=data['orientation'],
+                language=data['language'],
+                lemmatize=data['lemmatize'],
+                seed=data['seed'],
+                mask_shape=data['mask_shape'],
+                mask_image=data.get('mask_image'),
+                contour_width=data['contour_width'],
+                contour_color=data['contour_color'],
+                layout=layout,
                 image_url=image_url,
                 svg_url=None
             )
 
             print("Word cloud saved to database.", wordcloud)
 
+            if reservation:
+                reservation.commit()
+
             # Return the created word cloud data
             return Response(WordCloudSerializer(wordcloud).data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
             # If an error occurs, refund the credit if it was deducted
-            if data.get('is_ai_generated', False):
-                user_credit = UserCredit.objects.get(user=request.user)
-                user_credit.credits_remaining += 1
-                user_credit.save()
+            if reservation:
+                reservation.refund()
 
             return Response(
                 {'error': f'Failed to generate word cloud: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _generate_wordcloud_matplotlib(self, data):
-        """Generate word cloud using matplotlib and return PIL Image"""
-        # Configure word cloud
-        colormap = data['color_scheme'] if data['color_scheme'] != 'default' else None
+    def prepare_data(self, data):
+        """Hook for subclasses to transform validated data before rendering"""
+        return data
+
+    def prepare_layout(self, data):
+        """Pick a seed when none was given and reduce an uploaded mask to its stored form"""
+        data.setdefault('seed', generate_seed())
+        if data.get('mask_image'):
+            # Keep the mask as a compact 1-bit PNG at the canvas size
+            data['mask_image'] = encode_mask(data['mask_image'], data['width'], data['height'])
+        return data
+
+    def _render_and_upload(self, data):
+        """
+        Render the image, in a render worker process when WORDCLOUD_RENDER_WORKERS
+        is set, upload it and return its URL and the layout.
+        """
+        if settings.WORDCLOUD_RENDER_WORKERS:
+            try:
+                # The image reads straight from shared memory until the slot is released
+                with get_render_pool().render(render_options(data)) as (image, layout):
+                    return save_pil_image_to_azure(image, folder='wordclouds'), layout
+            except RasterTooLarge as e:
+                logger.info("Rendering in-process: %s", e)
+            except BrokenProcessPool as e:
+                logger.warning("Render worker died, rendering in-process: %r", e)
 
-        wordcloud = WC(
-            width=data['width'],
-            height=data['height'],
-            background_color=data['background_color'],
-            max_words=data['max_words'],
-            prefer_horizontal=1.0 if data['orientation'] == 'horizontal' else
-            0.0 if data['orientation'] == 'vertical' else 0.5,
-            scale=data['word_density'] / 50,
-            font_path=f"fonts/{data['font']}.ttf" if os.path.exists(f"fonts/{data['font']}.ttf") else None,
-            colormap=colormap
-        ).generate(data['input_text'])
-
-        # Create matplotlib figure
-        plt.figure(figsize=(data['width'] / 100, data['height'] / 100), dpi=100)
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.title(data['title'], fontsize=16)
-        plt.axis("off")
-        plt.tight_layout(pad=0)
-
-        # Save to BytesIO buffer
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='PNG', bbox_inches='tight', pad_inches=0, dpi=300)
-        plt.close()  # Important: close the figure to free memory
-
-        # Convert to PIL Image
-        img_buffer.seek(0)
-        pil_image = Image.open(img_buffer)
-
-        return pil_image
+        image, layout = render_generated(data)
+        return save_pil_image_to_azure(image, folder='wordclouds'), layout
 
     def _generate_wordcloud(self, data):
         """Generate word cloud image and SVG from input text (DEPRECATED - keeping for reference)"""
@@ -230,16 +510,16 @@ class GenerateWordCloudView(APIView):
         scale = data['word_density'] / 100
 
         # Configure word cloud
-        wordcloud = WC(
-            width=data['width'],
-            height=data['height'],
-            background_color=data['background_color'],
-            max_words=data['max_words'],
-            prefer_horizontal=1.0 if data['orientation'] == 'horizontal' else
-            0.0 if data['orientation'] == 'vertical' else 0.5,
-            scale=scale * 2,
-            font_path=f"fonts/{data['font']}.ttf" if os.path.exists(f"fonts/{data['font']}.ttf") else None,
-            colormap=data['color_scheme'] if data['color_scheme'] != 'default' else None
+        wordcloud = build_wordcloud(
+            data['font'],
+            data['width'],
+            data['height'],
+            data['background_color'],
+            data['max_words'],
+            data['orientation'],
+            scale * 2,
+            data['color_scheme'],
+            data.get('seed')
         )
 
         # Generate the word cloud
@@ -254,6 +534,96 @@ class GenerateWordCloudView(APIView):
         return wordcloud_img, svg_data
 
 
+class StreamGenerateWordCloudView(GenerateWordCloudView):
+    """
+    API view to generate a word cloud from very large text or a file upload.
+
+    The text is tokenized and counted chunk by chunk in bounded memory and only
+    the top ``max_words`` frequency table is rendered and stored; the raw text
+    is never kept on the model.
+    """
+    serializer_class = WordCloudStreamGenerateSerializer
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+
+    def prepare_data(self, data):
+        source = data.get('file') or data.get('input_text', '')
+        error_bound = data['error_bound'] if data['frequency_mode'] == 'approximate' else None
+        frequencies = stream_frequencies(
+            source,
+            max_words=data['max_words'],
+            language=data['language'],
+            lemmatize_words=data['lemmatize'],
+            error_bound=error_bound
+        )
+        return {**data, 'input_text': '', 'frequencies': frequencies}
+
+
+class WordCloudLayoutPreviewView(GenerateWordCloudView):
+    """
+    API view returning only the layout for generation options, as compact JSON
+    for the client to draw. Nothing is rasterized, uploaded, saved or charged.
+    """
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = self.prepare_data(serializer.validated_data)
+        if not data.get('input_text') and not data.get('frequencies'):
+            return Response(
+                {'error': 'No words found in the input.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            data = self.prepare_layout(data)
+            wordcloud = layout_wordcloud(data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(layout_response_data(
+            layout_to_json(wordcloud.layout_),
+            data['width'],
+            data['height'],
+            data['background_color'],
+            data['font'],
+            data['seed']
+        ))
+
+
+class WordCloudLayoutView(APIView):
+    """API view returning the layout of a saved word cloud as compact JSON"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            wordcloud = WordCloud.objects.get(pk=pk, user=request.user)
+        except WordCloud.DoesNotExist:
+            return Response(
+                {'error': 'Word cloud not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not wordcloud.layout:
+            # Rebuild from the seed and keep it for the next render
+            try:
+                wordcloud.layout = layout_to_json(restore_wordcloud(wordcloud).layout_)
+            except ValueError as e:
+                # e.g. the stored text has no words left after stopword removal
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            WordCloud.objects.filter(pk=wordcloud.pk).update(layout=wordcloud.layout)
+
+        return Response(layout_response_data(
+            wordcloud.layout,
+            wordcloud.width,
+            wordcloud.height,
+            wordcloud.background_color,
+            wordcloud.font,
+            wordcloud.seed
+        ))
+
+
 class WordCloudExportView(APIView):
     """API view to export a word cloud in different formats"""
     permission_classes = [IsAuthenticated]
@@ -285,24 +655,8 @@ class WordCloudExportView(APIView):
                     'high': 4
                 }[resolution]
 
-                # Regenerate word cloud with higher resolution
-                width = wordcloud.width * resolution_multiplier
-                height = wordcloud.height * resolution_multiplier
-
-                # Generate word cloud
-                wc_obj = WC(
-                    width=width,
-                    height=height,
-                    background_color=wordcloud.background_color,
-                    max_words=wordcloud.max_words,
-                    prefer_horizontal=1.0 if wordcloud.orientation == 'horizontal' else
-                    0.0 if wordcloud.orientation == 'vertical' else 0.5,
-                    scale=wordcloud.word_density / 50 * resolution_multiplier,
-                    font_path=f"fonts/{wordcloud.font}.ttf" if os.path.exists(f"fonts/{wordcloud.font}.ttf") else None,
-                    colormap=wordcloud.color_scheme if wordcloud.color_scheme != 'default' else None
-                )
-
-                wc_obj.generate(wordcloud.input_text)
+                # Draw the same layout at a higher resolution
+                wc_obj = restore_wordcloud(wordcloud, scale=wordcloud.word_density / 50 * resolution_multiplier)
                 img = wc_obj.to_image()
 
                 # Prepare response
@@ -313,19 +667,7 @@ class WordCloudExportView(APIView):
 
             elif export_format == 'svg':
                 # Generate word cloud
-                wc_obj = WC(
-                    width=wordcloud.width,
-                    height=wordcloud.height,
-                    background_color=wordcloud.background_color,
-                    max_words=wordcloud.max_words,
-                    prefer_horizontal=1.0 if wordcloud.orientation == 'horizontal' else
-                    0.0 if wordcloud.orientation == 'vertical' else 0.5,
-                    scale=wordcloud.word_density / 50,
-                    font_path=f"fonts/{wordcloud.font}.ttf" if os.path.exists(f"fonts/{wordcloud.font}.ttf") else None,
-                    colormap=wordcloud.color_scheme if wordcloud.color_scheme != 'default' else None
-                )
-
-                wc_obj.generate(wordcloud.input_text)
+                wc_obj = restore_wordcloud(wordcloud)
                 svg_data = wc_obj.to_svg()
 
                 # Prepare response
@@ -350,9 +692,10 @@ class AIWordSuggestionsView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if user has enough credits
-        user_credit = UserCredit.objects.get(user=request.user)
-        if user_credit.credits_remaining <= 0:
+        # Reserve a credit up front so concurrent requests cannot spend it twice
+        try:
+            reservation = credits.reserve(request.user)
+        except credits.InsufficientCredits:
             return Response(
                 {'error': 'You have no AI credits remaining. Please purchase more credits.'},
                 status=status.HTTP_402_PAYMENT_REQUIRED
@@ -369,44 +712,21 @@ class AIWordSuggestionsView(APIView):
                 {"role": "user", "content": f"Topic: {topic}"}
             ],
 
-            # Parse the response
-            response_text = run_prompt_gpt4mini(request, topic, count)
-
-            # Try to extract JSON array from the response
-            try:
-                # If the response is already a valid JSON array
-                words = json.loads(response_text)
-                if not isinstance(words, list):
-                    raise ValueError("Response is not a list")
-            except json.JSONDecodeError:
-                # If the response contains text around the JSON, try to extract it
-                import re
-                json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-                if json_match:
-                    try:
-                        words = json.loads(json_match.group(0))
-                    except json.JSONDecodeError:
-                        # If still can't parse, fall back to splitting by comma or newline
-                        words = [w.strip().strip('"\'[]') for w in response_text.replace('\n', ',').split(',')]
-                else:
-                    # Fall back to splitting by comma or newline
-                    words = [w.strip().strip('"\'[]') for w in response_text.replace('\n', ',').split(',')]
-
-            # Filter out any empty strings
-            words = [word for word in words if word]
-
-            # Deduct credit
-            user_credit.credits_remaining -= 1
-            user_credit.save()
+            # Ask the configured source (OpenAI and/or the local index)
+            words, source = get_word_suggestions(request, topic, count)
+            reservation.commit()
 
             # Create a string with frequency weights (repeating important words)
+            # and the same weights as a frequency map for generate_from_frequencies
             weighted_words = []
+            frequencies = {}
             for word in words:
                 # Add the word 1-5 times based on a simple random distribution
                 # This simulates frequency/importance
                 import random
                 weight = random.choices([1, 2, 3, 4, 5], weights=[0.5, 0.3, 0.1, 0.07, 0.03])[0]
                 weighted_words.extend([word] * weight)
+                frequencies[word] = frequencies.get(word, 0) + weight
 
             # Join with spaces to create a text string
             text = ' '.join(weighted_words)
@@ -414,14 +734,22 @@ class AIWordSuggestionsView(APIView):
             return Response({
                 'words': words,
                 'text': text,
-                'credits_remaining': user_credit.credits_remaining
+                'frequencies': frequencies,
+                'source': source,
+                'credits_remaining': user_cache.get_credits(request.user.pk)['balance']
             })
 
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # Upstream is unavailable and there was no local answer; give the credit back
+            reservation.refund()
+            return Response(
+                {'error': f'AI suggestions are temporarily unavailable: {str(e)}'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
         except Exception as e:
-            # If an error occurs, refund the credit if it was deducted
-            if user_credit.credits_remaining < UserCredit.objects.get(user=request.user).credits_remaining:
-                user_credit.credits_remaining += 1
-                user_credit.save()
+            # If an error occurs, refund the credit if it was not used
+            reservation.refund()
 
             return Response(
                 {'error': f'Failed to generate AI suggestions: {str(e)}'},
@@ -429,11 +757,57 @@ class AIWordSuggestionsView(APIView):
             )
 
 
-class UserCreditView(generics.RetrieveAPIView):
+class UserCreditView(ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     """API view to get user credit information"""
     serializer_class = UserCreditSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_validators(self):
+        """Latest ledger activity and the balance"""
+        user_credit = user_cache.get_credits(self.request.user.pk)
+        return (user_credit['last_activity'], user_credit['balance']) if user_credit else None
+
     def get_object(self):
-        """Return the user's credit object"""
-        return UserCredit.objects.get(user=self.request.user)
+        """Return the user's cached live ledger balance"""
+        user_credit = user_cache.get_credits(self.request.user.pk)
+        if user_credit is None:
+            raise Http404
+        return user_credit
+
+
+class UpstreamMetricsView(APIView):
+    """API view exposing circuit breaker state and upstream call timings"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(all_metrics())
+
+
+class BulkOnboardView(APIView):
+    """API view to create many users with their profiles and credits in bulk"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkOnboardSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = onboarding.onboard_users(
+                serializer.validated_data['users'],
+                batch_size=serializer.validated_data['batch_size'],
+                credits=serializer.validated_data.get('credits')
+            )
+        except IntegrityError:
+            # A username was created by a concurrent request; nothing was written
+            return Response(
+                {'error': 'Some of these users were created concurrently. Retry to skip them.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({
+            'created': result.created,
+            'skipped': result.skipped,
+            'rows': result.rows,
+            'seconds': round(result.seconds, 3),
+            'rows_per_second': round(result.rows / result.seconds) if result.seconds else None,
+        }, status=status.HTTP_201_CREATED)
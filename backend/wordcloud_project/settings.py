@@ -104,6 +104,7 @@ MIDDLEWARE = [
     # Other middleware
     'django.contrib.messages.middleware.MessageMiddleware',  # Flash messages
     'django.middleware.clickjacking.XFrameOptionsMiddleware',  # Clickjacking protection
+    'wordcloud_core.db_router.PinToPrimaryMiddleware',  # Read-your-writes for replica reads
 ]
 
 ROOT_URLCONF = 'wordcloud_project.urls'
@@ -148,6 +149,45 @@ else:
         },
     }
 
+# Read replicas. DB_REPLICA_HOSTS is a comma-separated list of host[:port]
+# entries, each a replica of the default database with the same name and
+# credentials. List, detail, search and credit GETs read from them (see
+# wordcloud_core/db_router.py); a user is pinned to the primary for
+# WORDCLOUD_REPLICA_PIN_SECONDS after each of their writes, which should
+# exceed the usual replication lag. The pins live in the user data cache, so
+# replicas require a shared USER_CACHE_BACKEND (system check wordcloud_core.E001).
+WORDCLOUD_READ_REPLICAS = []
+for number, address in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    WORDCLOUD_READ_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['wordcloud_core.db_router.ReadReplicaRouter']
+WORDCLOUD_REPLICA_PIN_SECONDS = int(os.environ.get('WORDCLOUD_REPLICA_PIN_SECONDS', 10))
+
+# Caches. Per-user credit and profile reads (wordcloud_core/user_cache.py) use the
+# 'user_data' cache, process-local by default, which is only correct with a
+# single worker process. Set USER_CACHE_BACKEND and USER_CACHE_LOCATION to share
+# it between workers (check --deploy warns otherwise), e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'user_data': {
+        'BACKEND': os.environ.get('USER_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('USER_CACHE_LOCATION', 'user-data'),
+    },
+}
+WORDCLOUD_USER_CACHE_ALIAS = os.environ.get('WORDCLOUD_USER_CACHE_ALIAS', 'user_data')
+# Upper bound on how long a cached entry can outlive a missed invalidation
+WORDCLOUD_USER_CACHE_TIMEOUT = int(os.environ.get('WORDCLOUD_USER_CACHE_TIMEOUT', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -275,6 +315,12 @@ REST_AUTH_SERIALIZERS = {
     'JWT_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenObtainPairSerializer',
 }
 
+# dj-rest-auth 3+ reads its settings from REST_AUTH. auth/user/ includes the
+# user's profile flags, read through the per-user cache
+REST_AUTH = {
+    'USER_DETAILS_SERIALIZER': 'authentication.serializers.UserDetailsSerializer',
+}
+
 # -------------------------------------------------------------------------
 # Authentication Settings
 # -------------------------------------------------------------------------
@@ -341,6 +387,26 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "backend/local_emails")
 # Get this from your OpenAI account and set in .env
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
+# Failure isolation for OpenAI calls (see wordcloud_core/resilience.py)
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_TIMEOUT_SECONDS', 20))  # Per-call deadline
+OPENAI_BREAKER_FAILURE_RATE = float(os.environ.get('OPENAI_BREAKER_FAILURE_RATE', 0.5))  # Error rate that opens the breaker
+OPENAI_BREAKER_MINIMUM_CALLS = int(os.environ.get('OPENAI_BREAKER_MINIMUM_CALLS', 5))  # Calls needed before it can open
+OPENAI_BREAKER_WINDOW_SECONDS = float(os.environ.get('OPENAI_BREAKER_WINDOW_SECONDS', 60))  # Rolling error-rate window
+OPENAI_BREAKER_RESET_SECONDS = float(os.environ.get('OPENAI_BREAKER_RESET_SECONDS', 30))  # Open time before a trial call
+OPENAI_HEDGE_REQUESTS = os.environ.get('OPENAI_HEDGE_REQUESTS', '1') == '1'  # Send a second attempt for slow calls
+# Fixed hedge delay in seconds; by default the recent p95 latency is used
+OPENAI_HEDGE_AFTER_SECONDS = float(os.environ['OPENAI_HEDGE_AFTER_SECONDS']) if os.environ.get('OPENAI_HEDGE_AFTER_SECONDS') else None
+
+# Where AI word suggestions come from:
+#   'openai'   - always call OpenAI
+#   'local'    - only use the offline co-occurrence index
+#   'fallback' - call OpenAI, answer from the local index after the latency budget or on error
+AI_SUGGESTIONS_SOURCE = os.environ.get('AI_SUGGESTIONS_SOURCE', 'fallback')
+AI_SUGGESTIONS_LATENCY_BUDGET = float(os.environ.get('AI_SUGGESTIONS_LATENCY_BUDGET', 8))
+
+# Offline suggestion index (build with: python manage.py build_suggestion_index)
+LOCAL_SUGGESTIONS_INDEX_DIR = os.environ.get('LOCAL_SUGGESTIONS_INDEX_DIR', BASE_DIR / 'suggestion_index')
+
 
 # -------------------------------------------------------------------------
 # Application-Specific Settings
@@ -348,6 +414,66 @@ OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 # Free usage limit for OpenAI API (number of generations)
 FREE_OPENAI_USAGE_LIMIT = 3
 
+# Parallel word counting: texts of at least WORDCLOUD_PARALLEL_MIN_CHARS characters
+# are counted in a pool of WORDCLOUD_COUNT_WORKERS processes
+WORDCLOUD_COUNT_WORKERS = int(os.environ.get('WORDCLOUD_COUNT_WORKERS', os.cpu_count() or 1))
+WORDCLOUD_PARALLEL_MIN_CHARS = int(os.environ.get('WORDCLOUD_PARALLEL_MIN_CHARS', 2 * 1024 * 1024))
+
+# Distinct words the streaming generate endpoint counts exactly. Beyond this it
+# keeps that many Space-Saving counters, so counts may be over-estimated by up to
+# (words in the text / WORDCLOUD_STREAM_MAX_DISTINCT_WORDS)
+WORDCLOUD_STREAM_MAX_DISTINCT_WORDS = int(os.environ.get('WORDCLOUD_STREAM_MAX_DISTINCT_WORDS', 200000))
+
+# Largest text file accepted by the streaming generate endpoint
+WORDCLOUD_MAX_UPLOAD_SIZE = int(os.environ.get('WORDCLOUD_MAX_UPLOAD_SIZE', 500 * 1024 * 1024))
+
+# Directory holding <font>.ttf for each WordCloud.FONT_CHOICES entry; missing
+# fonts fall back to the wordcloud package's bundled font
+WORDCLOUD_FONTS_DIR = os.environ.get('WORDCLOUD_FONTS_DIR', BASE_DIR / 'fonts')
+
+# Per-process render caches: loaded fonts per (font, size) and text bounding
+# boxes per (word, font, size, orientation)
+WORDCLOUD_FONT_CACHE_SIZE = int(os.environ.get('WORDCLOUD_FONT_CACHE_SIZE', 512))
+WORDCLOUD_TEXT_METRICS_CACHE_SIZE = int(os.environ.get('WORDCLOUD_TEXT_METRICS_CACHE_SIZE', 200000))
+
+# Memory budget for rasterized word sprites reused across renders (per process)
+WORDCLOUD_SPRITE_CACHE_BYTES = int(os.environ.get('WORDCLOUD_SPRITE_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Preprocessed masks kept per (shape, size), and the largest mask image upload
+WORDCLOUD_MASK_CACHE_SIZE = int(os.environ.get('WORDCLOUD_MASK_CACHE_SIZE', 64))
+WORDCLOUD_MAX_MASK_UPLOAD_SIZE = int(os.environ.get('WORDCLOUD_MAX_MASK_UPLOAD_SIZE', 5 * 1024 * 1024))
+
+# Render generated images in WORDCLOUD_RENDER_WORKERS separate processes (0 renders
+# in the request process). Rasters come back through WORDCLOUD_RENDER_SLOTS shared
+# memory slots of WORDCLOUD_RENDER_SLOT_BYTES each; larger images render in-process.
+# Images are rendered at 300 dpi: an 800x400 canvas needs about 11.5 MB, the
+# largest (2000x2000) about 144 MB.
+WORDCLOUD_RENDER_WORKERS = int(os.environ.get('WORDCLOUD_RENDER_WORKERS', 0))
+WORDCLOUD_RENDER_SLOTS = int(os.environ.get('WORDCLOUD_RENDER_SLOTS', 4))
+WORDCLOUD_RENDER_SLOT_BYTES = int(os.environ.get('WORDCLOUD_RENDER_SLOT_BYTES', 64 * 1024 * 1024))
+WORDCLOUD_RENDER_SLOT_TIMEOUT = float(os.environ.get('WORDCLOUD_RENDER_SLOT_TIMEOUT', 30))
+
+# Input texts of at least WORDCLOUD_TEXT_BLOB_THRESHOLD characters are stored
+# zlib-compressed (at WORDCLOUD_TEXT_COMPRESSION_LEVEL) in a separate table,
+# shared by every word cloud with the same text
+WORDCLOUD_TEXT_BLOB_THRESHOLD = int(os.environ.get('WORDCLOUD_TEXT_BLOB_THRESHOLD', 16 * 1024))
+WORDCLOUD_TEXT_COMPRESSION_LEVEL = int(os.environ.get('WORDCLOUD_TEXT_COMPRESSION_LEVEL', 6))
+# purge_text_blobs keeps unused blobs stored or reused within this many seconds,
+# so a save that is about to reference one never loses it
+WORDCLOUD_TEXT_BLOB_PURGE_GRACE = int(os.environ.get('WORDCLOUD_TEXT_BLOB_PURGE_GRACE', 3600))
+
+# Most users accepted by one bulk onboarding API request; larger imports go
+# through the onboard_users management command
+WORDCLOUD_ONBOARD_MAX_USERS = int(os.environ.get('WORDCLOUD_ONBOARD_MAX_USERS', 1000))
+
+# PostgreSQL text search configuration for word cloud search ('simple' does no
+# stemming, so it works the same for every input language)
+WORDCLOUD_SEARCH_CONFIG = os.environ.get('WORDCLOUD_SEARCH_CONFIG', 'simple')
+
+# AI credit ledger compaction (python manage.py compact_credit_ledger) only folds
+# entries older than this many seconds, so inserts still in flight are never skipped
+WORDCLOUD_CREDIT_COMPACTION_GRACE = int(os.environ.get('WORDCLOUD_CREDIT_COMPACTION_GRACE', 300))
+
 # -------------------------------------------------------------------------
 # API Documentation Settings
 # -------------------------------------------------------------------------
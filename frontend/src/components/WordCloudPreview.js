@@ -1,12 +1,60 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 
-const WordCloudPreview = ({ imageUrl, title, isLoading }) => {
+// CSS font families for the backend's font choices
+const FONT_FAMILIES = {
+  arial: 'Arial, sans-serif',
+  times: '"Times New Roman", serif',
+  courier: '"Courier New", monospace',
+  verdana: 'Verdana, sans-serif',
+  georgia: 'Georgia, serif',
+  trebuchet: '"Trebuchet MS", sans-serif',
+  comic: '"Comic Sans MS", cursive',
+};
+
+// Draw a layout from the layout endpoint: each word is
+// [text, fontSize, left, top, vertical, color] on a width x height canvas
+const drawLayout = (canvas, layout) => {
+  const ratio = window.devicePixelRatio || 1;
+  canvas.width = layout.width * ratio;
+  canvas.height = layout.height * ratio;
+
+  const ctx = canvas.getContext('2d');
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  ctx.fillStyle = layout.background_color;
+  ctx.fillRect(0, 0, layout.width, layout.height);
+  ctx.textBaseline = 'top';
+
+  const fontFamily = FONT_FAMILIES[layout.font] || 'sans-serif';
+  layout.words.forEach(([text, fontSize, left, top, vertical, color]) => {
+    ctx.font = `${fontSize}px ${fontFamily}`;
+    ctx.fillStyle = color;
+    if (vertical) {
+      // Rotated 90 degrees counter-clockwise, reading bottom to top
+      ctx.save();
+      ctx.translate(left, top + ctx.measureText(text).width);
+      ctx.rotate(-Math.PI / 2);
+      ctx.fillText(text, 0, 0);
+      ctx.restore();
+    } else {
+      ctx.fillText(text, left, top);
+    }
+  });
+};
+
+const WordCloudPreview = ({ imageUrl, layout, title, isLoading }) => {
   const [error, setError] = useState(false);
+  const canvasRef = useRef(null);
 
   useEffect(() => {
     setError(false);
   }, [imageUrl]);
 
+  useEffect(() => {
+    if (layout && canvasRef.current) {
+      drawLayout(canvasRef.current, layout);
+    }
+  }, [layout, imageUrl, isLoading]);
+
   if (isLoading) {
     return (
       <div className="flex flex-col items-center justify-center p-4 border border-gray-200 rounded-lg bg-gray-50 min-h-[300px]">
@@ -16,7 +64,7 @@ const WordCloudPreview = ({ imageUrl, title, isLoading }) => {
     );
   }
 
-  if (!imageUrl) {
+  if (!imageUrl && !layout) {
     return (
       <div className="flex flex-col items-center justify-center p-4 border border-gray-200 rounded-lg bg-gray-50 min-h-[300px]">
         <p className="text-gray-500">Preview will appear here</p>
@@ -31,7 +79,13 @@ const WordCloudPreview = ({ imageUrl, title, isLoading }) => {
           {title || 'Word Cloud Preview'}
         </h3>
         <div className="word-cloud-container">
-          {error ? (
+          {!imageUrl ? (
+            <canvas
+              ref={canvasRef}
+              className="max-w-full rounded-md"
+              style={{ width: '100%', aspectRatio: `${layout.width} / ${layout.height}` }}
+            />
+          ) : error ? (
             <div className="flex flex-col items-center justify-center p-4 border border-gray-200 rounded-lg bg-gray-50 min-h-[300px]">
               <p className="text-red-500">Failed to load image</p>
             </div>
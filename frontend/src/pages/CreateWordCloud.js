@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { HexColorPicker } from 'react-colorful';
 import { wordCloudApi, aiApi } from '../services/api';
@@ -31,6 +31,40 @@ const CreateWordCloud = () => {
   const [loading, setLoading] = useState(false);
   const [aiLoading, setAiLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Live preview: the layout is computed by the backend and drawn on a canvas
+  const [seed] = useState(() => Math.floor(Math.random() * 2147483647));
+  const [previewLayout, setPreviewLayout] = useState(null);
+  const [showImage, setShowImage] = useState(false);
+
+  useEffect(() => {
+    setShowImage(false);
+    if (!formData.input_text) {
+      setPreviewLayout(null);
+      return undefined;
+    }
+
+    // Wait until the user stops typing or dragging a slider
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await wordCloudApi.previewLayout({
+          ...formData,
+          title: formData.title || 'Preview',
+          seed
+        });
+        if (!cancelled) {
+          setPreviewLayout(response.data);
+        }
+      } catch (err) {
+        console.error('Error loading preview layout:', err);
+      }
+    }, 400);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [formData, seed]);
 
   const handleInputChange = (e) => {
     const { name, value, type, checked } = e.target;
@@ -101,8 +135,9 @@ const CreateWordCloud = () => {
       setLoading(true);
       setError(null);
       
-      const response = await wordCloudApi.generate(formData);
+      const response = await wordCloudApi.generate({ ...formData, seed });
       setGeneratedWordCloud(response.data);
+      setShowImage(true);
       
       toast.success('Word cloud generated successfully');
       
@@ -149,7 +184,8 @@ const CreateWordCloud = () => {
             {/* Word Cloud Preview */}
             <div className="mt-6">
               <WordCloudPreview 
-                imageUrl={generatedWordCloud?.image_url} 
+                imageUrl={showImage ? generatedWordCloud?.image_url : null} 
+                layout={previewLayout}
                 title={formData.title || 'Preview'} 
                 isLoading={loading}
               />
@@ -8,16 +8,19 @@ const Dashboard = () => {
   const [wordClouds, setWordClouds] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [query, setQuery] = useState('');
   const { userCredits } = useAuth();
 
   useEffect(() => {
     fetchWordClouds();
   }, []);
 
-  const fetchWordClouds = async () => {
+  const fetchWordClouds = async (searchQuery = '') => {
     try {
       setLoading(true);
-      const response = await wordCloudApi.getAll();
+      const response = searchQuery
+        ? await wordCloudApi.search(searchQuery)
+        : await wordCloudApi.getAll();
       setWordClouds(response.data.results || response.data);
       setError(null);
     } catch (err) {
@@ -44,6 +47,11 @@ const Dashboard = () => {
     }
   };
 
+  const handleSearch = (e) => {
+    e.preventDefault();
+    fetchWordClouds(query.trim());
+  };
+
   const formatDate = (dateString) => {
     const date = new Date(dateString);
     return date.toLocaleDateString(undefined, { year: 'numeric', month: 'short', day: 'numeric' });
@@ -71,6 +79,22 @@ const Dashboard = () => {
         </div>
       </div>
 
+      <form onSubmit={handleSearch} className="mt-6 flex">
+        <input
+          type="search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search titles and text"
+          className="block w-full rounded-md border-0 py-1.5 text-gray-900 shadow-sm ring-1 ring-inset ring-gray-300 placeholder:text-gray-400 focus:ring-2 focus:ring-inset focus:ring-primary-600 sm:text-sm sm:leading-6"
+        />
+        <button
+          type="submit"
+          className="ml-3 rounded-md bg-white px-3 py-2 text-sm font-semibold text-gray-900 shadow-sm ring-1 ring-inset ring-gray-300 hover:bg-gray-50"
+        >
+          Search
+        </button>
+      </form>
+
       {loading ? (
         <div className="mt-6 flex justify-center">
           <div className="animate-spin rounded-full h-12 w-12 border-t-2 border-b-2 border-primary-500"></div>
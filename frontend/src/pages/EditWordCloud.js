@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { HexColorPicker } from 'react-colorful';
 import { wordCloudApi, aiApi } from '../services/api';
@@ -32,15 +32,48 @@ const EditWordCloud = () => {
   const [saving, setSaving] = useState(false);
   const [aiLoading, setAiLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Live preview of unsaved changes, drawn on a canvas from the backend layout
+  const [previewLayout, setPreviewLayout] = useState(null);
+  const loadedData = useRef(null);
 
   useEffect(() => {
     fetchWordCloud();
   }, [id]);
 
+  useEffect(() => {
+    if (formData === loadedData.current || (!formData.input_text && !formData.frequencies)) {
+      setPreviewLayout(null);
+      return undefined;
+    }
+
+    // Wait until the user stops typing or dragging a slider
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await wordCloudApi.previewLayout({
+          ...formData,
+          title: formData.title || 'Preview',
+          frequencies: formData.frequencies || undefined
+        });
+        if (!cancelled) {
+          setPreviewLayout(response.data);
+        }
+      } catch (err) {
+        console.error('Error loading preview layout:', err);
+      }
+    }, 400);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [formData]);
+
   const fetchWordCloud = async () => {
     try {
       setLoading(true);
       const response = await wordCloudApi.getById(id);
+      loadedData.current = response.data;
       setFormData(response.data);
       setError(null);
     } catch (err) {
@@ -209,7 +242,8 @@ const EditWordCloud = () => {
             {/* Word Cloud Preview */}
             <div className="mt-6">
               <WordCloudPreview 
-                imageUrl={formData.image_url} 
+                imageUrl={previewLayout ? null : formData.image_url} 
+                layout={previewLayout}
                 title={formData.title || 'Preview'} 
                 isLoading={false}
               />
@@ -44,6 +44,8 @@ api.interceptors.response.use(
 export const wordCloudApi = {
   getAll: () => api.get('/wordclouds/'),
   
+  search: (query) => api.get('/wordclouds/search/', { params: { q: query } }),
+  
   getById: (id) => api.get(`/wordclouds/${id}/`),
   
   create: (wordCloudData) => api.post('/wordclouds/', wordCloudData),
@@ -54,6 +56,10 @@ export const wordCloudApi = {
   
   generate: (wordCloudData) => api.post('/wordclouds/generate/', wordCloudData),
   
+  previewLayout: (wordCloudData) => api.post('/wordclouds/layout/', wordCloudData),
+  
+  getLayout: (id) => api.get(`/wordclouds/${id}/layout/`),
+  
   export: (id, format, resolution) => api.post(
     `/wordclouds/${id}/export/`,
     { format, resolution },
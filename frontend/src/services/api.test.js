@@ -93,6 +93,46 @@ describe('API Services', () => {
       expect(result).toEqual(mockResponse);
     });
 
+    test('previewLayout should call the correct endpoint with data', async () => {
+      // Setup
+      const mockData = { input_text: 'Test text' };
+      const mockResponse = { data: { width: 800, height: 400, words: [['test', 40, 10, 20, 0, 'rgb(0, 0, 0)']] } };
+      axios.post.mockResolvedValue(mockResponse);
+
+      // Execute
+      const result = await wordCloudApi.previewLayout(mockData);
+
+      // Verify
+      expect(axios.post).toHaveBeenCalledWith('/wordclouds/layout/', mockData);
+      expect(result).toEqual(mockResponse);
+    });
+
+    test('search should call the search endpoint with the query', async () => {
+      // Setup
+      const mockResponse = { data: { results: [], next: null, previous: null } };
+      axios.get.mockResolvedValue(mockResponse);
+
+      // Execute
+      const result = await wordCloudApi.search('ocean');
+
+      // Verify
+      expect(axios.get).toHaveBeenCalledWith('/wordclouds/search/', { params: { q: 'ocean' } });
+      expect(result).toEqual(mockResponse);
+    });
+
+    test('getLayout should call the correct endpoint with ID', async () => {
+      // Setup
+      const mockResponse = { data: { width: 800, height: 400, words: [] } };
+      axios.get.mockResolvedValue(mockResponse);
+
+      // Execute
+      const result = await wordCloudApi.getLayout(1);
+
+      // Verify
+      expect(axios.get).toHaveBeenCalledWith('/wordclouds/1/layout/');
+      expect(result).toEqual(mockResponse);
+    });
+
     test('export should call the correct endpoint with ID and format', async () => {
       // Setup
       const mockResponse = { data: new Blob(['test']) };